@@ -0,0 +1,312 @@
+# Benchmark for the recording -> transcription -> clipboard pipeline.
+#
+# Drives whisper.run_transcription and the job queue with fake_whisper.py standing in for
+# whisper-faster (configurable latency, deterministic output), replays a corpus of WAVs and
+# reports throughput, real-time factor, p50/p95 end-to-end latency and peak memory.
+# Results are compared against a stored baseline; a regression beyond the tolerance exits 1.
+# --startup measures a cold `import whisper` and a headless one-file run instead, and fails if
+# the import pulls in the audio, hotkey, tray or clipboard modules.
+#
+#   python benchmark.py --save-baseline     # record the baseline on this machine
+#   python benchmark.py                     # compare against it
+#   python benchmark.py --startup           # startup cost, with its own baseline
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+import whisper
+
+BENCHMARK_DIR = whisper.PROJECT_ROOT / "tmp" / "benchmark"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_STARTUP_BASELINE = BENCHMARK_DIR / "startup-baseline.json"
+SAMPLE_RATE = 16000
+
+# Metric name -> True if higher is better
+METRICS = {
+    "throughput_files_per_s": True,
+    "audio_seconds_per_s": True,
+    "real_time_factor": False,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "peak_memory_mb": False,
+}
+STARTUP_METRICS = {
+    "import_ms": False,
+    "headless_run_ms": False,
+}
+# Modules that need an audio device or a display; headless runs must not import them
+GUI_MODULES = ["sounddevice", "pynput", "pystray", "PIL", "pyperclip", "scipy"]
+IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import whisper\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+)
+
+
+class ClipboardRecorder:
+    """Replaces pyperclip in the benchmark: records when the clipboard would have been filled."""
+
+    def __init__(self):
+        self.copied = threading.Event()
+        self.copied_at = None
+
+    def copy(self, text):
+        self.copied_at = time.perf_counter()
+        self.copied.set()
+
+
+def generate_corpus(directory, lengths):
+    """Writes one deterministic speech-like WAV per length (seconds) and returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    paths = []
+    for length in lengths:
+        path = os.path.join(directory, f"corpus-{length:g}s.wav")
+        if not os.path.exists(path):
+            t = np.arange(int(length * SAMPLE_RATE)) / SAMPLE_RATE
+            # Noise modulated at syllable rate, so VAD-like stages see speech and pauses
+            envelope = np.clip(np.sin(2 * np.pi * 0.7 * t), 0, None)
+            audio = rng.standard_normal(len(t)) * envelope * 4000
+            with wave.open(path, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(SAMPLE_RATE)
+                wav_file.writeframes(audio.astype(np.int16).tobytes())
+        paths.append(path)
+    return paths
+
+
+def make_fake_executable(directory):
+    """Wraps fake_whisper.py in a script that SubprocessEngine can run like whisper-faster."""
+    fake_script = whisper.PROJECT_ROOT / "fake_whisper.py"
+    os.makedirs(directory, exist_ok=True)
+    if os.name == "nt":
+        path = os.path.join(directory, "fake_whisper.cmd")
+        with open(path, "w") as f:
+            f.write(f'@"{sys.executable}" "{fake_script}" %*\n')
+    else:
+        path = os.path.join(directory, "fake_whisper.sh")
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_script}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def start_pipeline(args):
+    """Configures whisper.py for the benchmark and starts its workers and artifact writer."""
+    os.environ["FAKE_WHISPER_LATENCY"] = str(args.latency)
+    os.environ["FAKE_WHISPER_RTF"] = str(args.rtf)
+    recorder = ClipboardRecorder()
+    whisper.pyperclip = recorder
+    whisper.copy_to_clipboard = True
+    whisper.show_stats = False
+    whisper.transcription_cache = None  # Every run must do the work
+    whisper.worker_count = args.workers
+
+    if args.engine == "stub":
+        whisper.engines = [whisper.StubEngine(latency=args.latency) for _ in range(args.workers)]
+    else:
+        executable = make_fake_executable(BENCHMARK_DIR)
+        whisper.engines = [whisper.SubprocessEngine(executable, whisper.model_path) for _ in range(args.workers)]
+    whisper.engine = whisper.engines[0]
+
+    threading.Thread(target=whisper.run_artifact_writer, daemon=True).start()
+    for index, worker_engine in enumerate(whisper.engines, start=1):
+        threading.Thread(
+            target=whisper.run_transcription, args=(f"worker-{index}", worker_engine), daemon=True
+        ).start()
+    return recorder
+
+
+def prepare_run_files(corpus, run_dir, name):
+    """Copies the corpus into a fresh directory so transcripts don't pile up between runs."""
+    target = os.path.join(run_dir, name)
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    return [shutil.copy(path, target) for path in corpus]
+
+
+def measure_latency(recorder, files):
+    """Replays each file as a dictation: time from enqueue until the clipboard is filled."""
+    latencies = []
+    for path in files:
+        recorder.copied.clear()
+        started = time.perf_counter()
+        whisper.queue_interactive((path, False, time.time(), {}))
+        whisper.transcription_queue.join()
+        if not recorder.copied.is_set():
+            raise RuntimeError(f"No transcription reached the clipboard for {path}")
+        latencies.append(recorder.copied_at - started)
+    whisper.artifact_queue.join()
+    return latencies
+
+
+def measure_throughput(files):
+    """Queues all files as a batch and returns the wall-clock time until every output exists."""
+    started = time.perf_counter()
+    for path in files:
+        whisper.queue_batch_file(path, True)
+    whisper.transcription_queue.join()
+    whisper.artifact_queue.join()
+    return time.perf_counter() - started
+
+
+def run_benchmark(args):
+    if args.corpus:
+        corpus = sorted(
+            os.path.join(args.corpus, name) for name in os.listdir(args.corpus) if name.lower().endswith(".wav")
+        )
+    else:
+        corpus = generate_corpus(BENCHMARK_DIR / "corpus", [float(length) for length in args.lengths.split(",")])
+    durations = [whisper.get_wav_duration(path) for path in corpus]
+    run_dir = BENCHMARK_DIR / "runs"
+    latency_files = prepare_run_files(corpus, run_dir, "latency") * args.repeat
+    throughput_files = prepare_run_files(corpus, run_dir, "throughput") * args.repeat
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    tracemalloc.start()
+    with output:
+        recorder = start_pipeline(args)
+        latencies = measure_latency(recorder, latency_files)
+        wall_time = measure_throughput(throughput_files)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_audio = sum(durations) * args.repeat
+    return {
+        "files": len(throughput_files),
+        "audio_seconds": round(total_audio, 3),
+        "throughput_files_per_s": round(len(throughput_files) / wall_time, 4),
+        "audio_seconds_per_s": round(total_audio / wall_time, 4),
+        "real_time_factor": round(sum(latencies) / total_audio, 4),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 3),
+    }
+
+
+def run_startup_benchmark(args):
+    """Times `import whisper` and a headless stub-engine run of one short file, each in a fresh interpreter."""
+    corpus = generate_corpus(BENCHMARK_DIR / "corpus", [2.0])
+    import_times = []
+    run_times = []
+    loaded = set()
+    for attempt in range(args.repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE % GUI_MODULES],
+            cwd=whisper.PROJECT_ROOT, check=True, capture_output=True, text=True,
+        )
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(probe["seconds"])
+        loaded.update(probe["loaded"])
+
+        files = prepare_run_files(corpus, BENCHMARK_DIR / "runs", "startup")
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(whisper.PROJECT_ROOT / "whisper.py"), "--headless", "--engine", "stub",
+             "--no-cache", *files],
+            check=True, stdout=None if args.verbose else subprocess.DEVNULL,
+        )
+        run_times.append(time.perf_counter() - started)
+    return {
+        "import_ms": round(float(np.median(import_times)) * 1000, 1),
+        "headless_run_ms": round(float(np.median(run_times)) * 1000, 1),
+        "gui_modules_loaded": sorted(loaded),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance, metrics=METRICS):
+    """Prints a comparison table and returns the list of regressed metrics."""
+    regressions = []
+    print(f"\n{'Metric':<24}{'Baseline':>12}{'Current':>12}{'Change':>10}")
+    for metric, higher_is_better in metrics.items():
+        old, new = baseline.get(metric), results[metric]
+        if not old:
+            print(f"{metric:<24}{'-':>12}{new:>12}{'':>10}")
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{metric:<24}{old:>12}{new:>12}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recording -> transcription -> clipboard pipeline.")
+    parser.add_argument("--engine", choices=["subprocess", "stub"], default="subprocess",
+                        help="subprocess runs fake_whisper.py like whisper-faster; stub stays in-process.")
+    parser.add_argument("--corpus", default=None, help="Directory of WAVs to replay (default: generated corpus).")
+    parser.add_argument("--lengths", default="2,5,10,30,60", help="Generated corpus lengths in seconds.")
+    parser.add_argument("--repeat", type=int, default=2, help="Replays of the corpus per phase.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker pool size.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake engine latency per job (seconds).")
+    parser.add_argument("--rtf", type=float, default=0.05, help="Fake engine seconds per audio second.")
+    parser.add_argument("--startup", action="store_true",
+                        help="Measure import and headless startup time instead of the pipeline.")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown (0.15 = 15%%).")
+    parser.add_argument("--json", default=None, help="Also write the results to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output.")
+    args = parser.parse_args()
+
+    if args.startup:
+        settings = {"startup": True, "repeat": args.repeat}
+        results = run_startup_benchmark(args)
+        metrics = STARTUP_METRICS
+        args.baseline = args.baseline or str(DEFAULT_STARTUP_BASELINE)
+    else:
+        settings = {key: getattr(args, key) for key in ("engine", "corpus", "lengths", "repeat", "workers", "latency", "rtf")}
+        results = run_benchmark(args)
+        metrics = METRICS
+        args.baseline = args.baseline or str(DEFAULT_BASELINE)
+    report = {"version": whisper.__version__, "host": platform.node(), "settings": settings, "results": results}
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if results.get("gui_modules_loaded"):
+        print(f"\nFAILED: `import whisper` loaded {', '.join(results['gui_modules_loaded'])}; headless runs must not.")
+        sys.exit(1)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print("\nWarning: the baseline was recorded with different settings:", baseline.get("settings"))
+    regressions = compare_to_baseline(results, baseline.get("results", {}), args.tolerance, metrics)
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} metric(s) regressed more than {args.tolerance:.0%} "
+              f"against v{baseline.get('version')}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nOK: no metric regressed more than {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Engine worker for the resident transcription backend.
+#
+# Keeps Whisper models loaded between jobs and talks to whisper.py over a
+# JSON-lines protocol on stdin/stdout:
+#   -> {"id": 1, "cmd": "ping"}
+#   <- {"id": 1, "ok": true, "pong": true}
+#   -> {"id": 2, "cmd": "transcribe", "audio": "rec.wav", "model": "base", ...}
+#   <- {"id": 2, "ok": true, "segments": [{"start": 0.0, "end": 1.5, "text": "..."}],
+#       "timings": {"load": 0.0, "inference": 0.8}}
+#   -> {"id": 3, "cmd": "transcribe_pcm", "sample_rate": 16000, "channels": 1, "pcm_bytes": 32000, ...}
+#      followed by pcm_bytes of raw int16 PCM, so recordings never touch the disk
+# Logs go to stderr so stdout stays reserved for protocol messages.
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+WHISPER_SAMPLE_RATE = 16000
+
+
+def get_wav_duration(audio_path):
+    """Returns the duration of a WAV file in seconds, or 0.0 if it can't be read."""
+    try:
+        with wave.open(str(audio_path), "rb") as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        return 0.0
+
+
+def pcm_to_float(pcm_bytes, channels=1, sample_rate=WHISPER_SAMPLE_RATE):
+    """Converts raw int16 PCM into the mono float32 16 kHz array Whisper expects."""
+    audio = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if sample_rate != WHISPER_SAMPLE_RATE and len(audio):
+        target_length = int(len(audio) * WHISPER_SAMPLE_RATE / sample_rate)
+        positions = np.linspace(0, len(audio) - 1, target_length)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+
+def stub_segments(duration, segment_length=2.0):
+    """Deterministic fake transcription: one numbered segment per segment_length seconds."""
+    segments = []
+    count = max(1, int(-(-duration // segment_length)))  # Ceiling division
+    for i in range(count):
+        start = i * segment_length
+        end = min(duration, start + segment_length) if duration else segment_length
+        segments.append({"start": round(start, 3), "end": round(end, 3), "text": f"Stub segment {i + 1}."})
+    return segments
+
+
+class StubBackend:
+    """Backend without a model, used to exercise the protocol in tests."""
+
+    def __init__(self, model_dir, latency=0.0):
+        self.latency = latency
+
+    def load(self, model, threads=None):
+        pass
+
+    def transcribe(self, request, audio=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if audio is not None:
+            return stub_segments(len(audio) / float(WHISPER_SAMPLE_RATE))
+        return stub_segments(get_wav_duration(request["audio"]))
+
+
+class FasterWhisperBackend:
+    """Backend built on the faster-whisper package; models stay loaded in memory."""
+
+    def __init__(self, model_dir, latency=0.0):
+        from faster_whisper import WhisperModel  # Imported here so the stub backend has no dependency
+        self.WhisperModel = WhisperModel
+        self.model_dir = model_dir
+        self.models = {}  # model -> (threads, WhisperModel)
+
+    def load(self, model, threads=None):
+        """Returns the loaded model, reloading it when a different thread count is requested.
+
+        CTranslate2 fixes the thread count when a model is created, so a cached model only
+        serves requests for its own count (or requests that don't name one).
+        """
+        loaded = self.models.get(model)
+        if loaded is not None and (threads is None or loaded[0] == threads):
+            return loaded[1]
+        # Purfview layout: <model_dir>/faster-whisper-<model>
+        local_path = os.path.join(self.model_dir, f"faster-whisper-{model}")
+        model_ref = local_path if os.path.isdir(local_path) else model
+        if loaded is None:
+            print(f"[worker] Loading model {model_ref}...", file=sys.stderr)
+        else:
+            print(f"[worker] Reloading model {model_ref} for {threads} threads (was {loaded[0] or 'default'})...", file=sys.stderr)
+        self.models.pop(model, None)  # Free the old instance before the new one is allocated
+        instance = self.WhisperModel(model_ref, download_root=self.model_dir, cpu_threads=threads or 0)
+        self.models[model] = (threads, instance)
+        return instance
+
+    def transcribe(self, request, audio=None):
+        model = self.load(request.get("model", "base"), request.get("threads"))
+        one_word = request.get("one_word", False)
+        segments_iter, _info = model.transcribe(
+            audio if audio is not None else request["audio"],
+            task="transcribe",
+            language=request.get("language"),
+            word_timestamps=one_word,
+        )
+        segments = []
+        for segment in segments_iter:
+            if one_word and segment.words:
+                for word in segment.words:
+                    segments.append({"start": word.start, "end": word.end, "text": word.word.strip()})
+            else:
+                segments.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+        return segments
+
+
+BACKENDS = {
+    "faster-whisper": FasterWhisperBackend,
+    "stub": StubBackend,
+}
+
+
+def timed(function, *args):
+    """Runs function and returns how long it took in seconds."""
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident Whisper engine worker.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="faster-whisper")
+    parser.add_argument("--model_dir", default="")
+    parser.add_argument("--preload", default=None, help="Model to load before reporting ready.")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads for the preloaded model.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial latency for the stub backend.")
+    args = parser.parse_args()
+
+    backend = BACKENDS[args.backend](args.model_dir, latency=args.latency)
+    if args.preload:
+        backend.load(args.preload, args.threads)
+    send({"event": "ready", "pid": os.getpid(), "backend": args.backend})
+
+    # Binary stdin: header lines are JSON, PCM payloads follow their header as raw bytes
+    stdin = sys.stdin.buffer
+    while True:
+        line = stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        request = {}
+        try:
+            request = json.loads(line.decode("utf-8"))
+            cmd = request.get("cmd")
+            if cmd == "ping":
+                send({"id": request.get("id"), "ok": True, "pong": True})
+            elif cmd == "load":
+                backend.load(request["model"], request.get("threads"))
+                send({"id": request.get("id"), "ok": True})
+            elif cmd == "transcribe":
+                timings = {"load": timed(backend.load, request.get("model", "base"), request.get("threads"))}
+                started = time.perf_counter()
+                segments = backend.transcribe(request)
+                timings["inference"] = time.perf_counter() - started
+                send({"id": request.get("id"), "ok": True, "segments": segments, "timings": timings})
+            elif cmd == "transcribe_pcm":
+                pcm_bytes = stdin.read(request["pcm_bytes"])
+                started = time.perf_counter()
+                audio = pcm_to_float(pcm_bytes, request.get("channels", 1), request.get("sample_rate", WHISPER_SAMPLE_RATE))
+                timings = {"decode": time.perf_counter() - started}
+                timings["load"] = timed(backend.load, request.get("model", "base"), request.get("threads"))
+                started = time.perf_counter()
+                segments = backend.transcribe(request, audio)
+                timings["inference"] = time.perf_counter() - started
+                send({"id": request.get("id"), "ok": True, "segments": segments, "timings": timings})
+            elif cmd == "shutdown":
+                send({"id": request.get("id"), "ok": True})
+                break
+            else:
+                send({"id": request.get("id"), "ok": False, "error": f"Unknown command: {cmd}"})
+        except Exception as e:
+            send({"id": request.get("id"), "ok": False, "error": str(e)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Fake whisper-faster executable for benchmarks.
+#
+# Accepts the same command line as whisper-faster (see SubprocessEngine.transcribe),
+# sleeps for a configurable time and writes a deterministic SRT, so the pipeline can be
+# measured without loading a model:
+#   FAKE_WHISPER_LATENCY   fixed seconds per job (process start, model load), default 0.2
+#   FAKE_WHISPER_RTF       additional seconds per second of audio, default 0.05
+import argparse
+import os
+import sys
+import time
+
+from engine_worker import get_wav_duration, stub_segments
+
+
+def format_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02}:{minutes:02}:{secs:02},{milliseconds:03}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake whisper-faster with deterministic output.")
+    parser.add_argument("audio")
+    parser.add_argument("--task", default="transcribe")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--model_dir", default="")
+    parser.add_argument("--output_dir", default=".")
+    parser.add_argument("--output_format", default="srt")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--one_word", default=None)
+    parser.add_argument("--sentence", action="store_true")
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--beep_off", action="store_true")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio):
+        print(f"File not found: {args.audio}", file=sys.stderr)
+        sys.exit(1)
+
+    duration = get_wav_duration(args.audio)
+    latency = float(os.environ.get("FAKE_WHISPER_LATENCY", "0.2"))
+    rtf = float(os.environ.get("FAKE_WHISPER_RTF", "0.05"))
+    time.sleep(latency + duration * rtf)
+
+    segment_length = 0.5 if args.one_word else 2.0
+    basename = os.path.splitext(os.path.basename(args.audio))[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, f"{basename}.srt"), "w", encoding="utf-8") as srt_file:
+        for index, segment in enumerate(stub_segments(duration, segment_length), start=1):
+            srt_file.write(
+                f"{index}\n{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n"
+                f"{segment['text']}\n\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
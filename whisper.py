@@ -1,388 +1,4217 @@
-import sounddevice as sd
-from scipy.io.wavfile import write
-from pynput import keyboard
 import subprocess
 import threading
 import os
-import shutil
 import numpy as np
 import argparse
-import pyperclip
+import importlib
+import platform
 from datetime import datetime
-import pystray
-from PIL import Image
 import sys
 import time
-from queue import Queue
+import heapq
+import bisect
+import itertools
+from queue import Queue, Empty
 import configparser
+import csv
+import wave
+import json
+import hashlib
+import io
+import struct
+import sqlite3
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
 from pathlib import Path
+from engine_worker import get_wav_duration, stub_segments
 
-__version__ = "1.22.2"
+__version__ = "1.47.0"
+
+
+class LazyModule:
+    """Stands in for a module that is imported on first use.
+
+    The audio, hotkey, tray and clipboard modules make up most of the startup time and need
+    an audio device or a display, which headless batch runs never touch.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+sd = LazyModule("sounddevice")
+keyboard = LazyModule("pynput.keyboard")
+pyperclip = LazyModule("pyperclip")
+pystray = LazyModule("pystray")
+Image = LazyModule("PIL.Image")
 
 # --- Constants ---
 PROJECT_ROOT = Path(__file__).resolve().parent
 CONFIG_FILE = PROJECT_ROOT / "config.ini"
 SUPPORTED_EXTENSIONS = {'.wav', '.mp3', '.m4a', '.mp4', '.mkv', '.flac', '.ogg', '.aac'}
+MODELS = ["base", "medium", "distil-large-v3", "large-v3-turbo"]
+MODEL_AUTO = "auto"  # Let the ModelRouter pick a model per job
+LANGUAGES = [("en", "English"), ("de", "Deutsch"), ("ru", "Russian"), ("uk", "Ukrainian")]
+
+
+def get_unique_output_base(audio_path, language=None, extensions=("srt",)):
+    """Returns the base path (no extension) for a new set of transcripts: filename[.N][.language]
+
+    Adds .1, .2, etc. until none of the given extensions exists, so all formats of one job share a name.
+    """
+    stem = os.path.splitext(str(audio_path))[0]
+    language_suffix = f".{language}" if language else ""
+    counter = 0
+    while True:
+        base = f"{stem}{f'.{counter}' if counter else ''}{language_suffix}"
+        if not any(os.path.exists(f"{base}.{extension}") for extension in extensions):
+            return base
+        counter += 1
+
+
+def get_files_from_clipboard():
+    """Extracts valid existing audio/video files from clipboard text."""
+    try:
+        text = pyperclip.paste()
+        if not text:
+            return []
+
+        lines = text.splitlines()
+        found_files = []
+        for line in lines:
+            line = line.strip().strip('"')  # Remove quotes if copied from explorer
+            if not line:
+                continue
+            path = Path(line)
+            if path.exists() and path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                found_files.append(str(path))
+        return found_files
+    except Exception as e:
+        print(f"Error reading clipboard: {e}")
+        return []
+
+
+def load_configuration(config_path):
+    """Reads config.ini; a missing file gives the defaults, main() decides whether that is fatal."""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config
+
+
+config = load_configuration(CONFIG_FILE)
+
+# Configuration parameters from config file
+whisper_faster_path = config.get("paths", "whisper_faster_executable", fallback="whisper-faster")
+
+base_dir_raw = config.get("paths", "base_directory", fallback="tmp")
+if os.path.isabs(base_dir_raw):
+    base_dir = base_dir_raw
+else:
+    base_dir = str(PROJECT_ROOT / base_dir_raw)
+
+model_path = config.get("paths", "model_directory", fallback="")
+# ffmpeg/ffprobe are used to decode media to PCM (long-file chunking); ffprobe is looked up next to ffmpeg
+ffmpeg_path = config.get("paths", "ffmpeg_executable", fallback="ffmpeg")
+hotkey = config.get("settings", "hotkey", fallback="<ctrl>+<alt>+e")
+hotkey_fragment = config.get("settings", "hotkey_fragment", fallback="<ctrl>+<alt>+f")
+# Optional hotkeys that switch language/model live (empty = disabled)
+hotkey_cycle_language = config.get("settings", "hotkey_cycle_language", fallback="").strip()
+hotkey_cycle_model = config.get("settings", "hotkey_cycle_model", fallback="").strip()
+
+# Engine backend settings (optional section, defaults keep the classic subprocess behavior)
+engine_backend = config.get("engine", "backend", fallback="subprocess")
+resident_python = config.get("engine", "resident_python", fallback="") or sys.executable
+resident_backend = config.get("engine", "resident_backend", fallback="faster-whisper")
+# Load a newly selected model on resident engines right away instead of with the next job
+prewarm_on_switch = config.getboolean("engine", "prewarm_on_switch", fallback=True)
+health_check_interval = config.getfloat("engine", "health_check_interval", fallback=30.0)
+in_memory_handoff = config.getboolean("engine", "in_memory", fallback=False)
+
+# Processing pool: concurrent transcription jobs share the machine's cores
+worker_count = config.getint("processing", "workers", fallback=1)
+cpu_budget = config.getint("processing", "cpu_budget", fallback=0) or os.cpu_count() or 8
+# Thread profiles measured by --autotune, per host and model
+thread_profiles_raw = config.get("processing", "thread_profiles", fallback="tmp/thread_profiles.json")
+thread_profiles_path = thread_profiles_raw if os.path.isabs(thread_profiles_raw) else str(PROJECT_ROOT / thread_profiles_raw)
+autotune_clip = config.get("processing", "autotune_clip", fallback="").strip()
+autotune_threads = [
+    int(count) for count in config.get("processing", "autotune_threads", fallback="").split(",") if count.strip()
+]
+autotune_repeats = config.getint("processing", "autotune_repeats", fallback=2)
+# Interrupt (and requeue) a running batch job when live dictation finds no free worker
+preempt_batch = config.getboolean("processing", "preempt_batch", fallback=False)
+
+# Long-file mode: media longer than min_duration is split at silences and transcribed in parallel chunks
+long_files_enabled = config.getboolean("long_files", "enabled", fallback=False)
+long_min_duration = config.getfloat("long_files", "min_duration_seconds", fallback=600.0)
+long_chunk_seconds = config.getfloat("long_files", "chunk_seconds", fallback=300.0)
+long_overlap_seconds = config.getfloat("long_files", "overlap_seconds", fallback=5.0)
+long_search_seconds = config.getfloat("long_files", "search_seconds", fallback=15.0)
+if long_chunk_seconds <= 0:
+    print(f"[long_files] chunk_seconds must be positive, not {long_chunk_seconds:g}; using 300.")
+    long_chunk_seconds = 300.0
+if not 0 <= long_search_seconds < long_chunk_seconds:
+    # A window as wide as a chunk lets every cut land right after the previous one
+    print(f"[long_files] search_seconds ({long_search_seconds:g}) must be below chunk_seconds ({long_chunk_seconds:g}); "
+          f"using {long_chunk_seconds / 4:g}.")
+    long_search_seconds = long_chunk_seconds / 4
+
+# Prefetch: decode the next queued batch files to PCM while the current one is transcribed
+prefetch_enabled = config.getboolean("prefetch", "enabled", fallback=False)
+prefetch_memory_mb = config.getfloat("prefetch", "memory_mb", fallback=1024.0)
+prefetch_extensions = {
+    extension.strip().lower()
+    for extension in config.get("prefetch", "extensions", fallback=",".join(sorted(SUPPORTED_EXTENSIONS))).split(",")
+    if extension.strip()
+}
+
+# Result cache: transcriptions keyed by audio content + model, language and mode
+cache_enabled = config.getboolean("cache", "enabled", fallback=True)
+cache_dir_raw = config.get("cache", "directory", fallback="tmp/cache")
+cache_dir = cache_dir_raw if os.path.isabs(cache_dir_raw) else str(PROJECT_ROOT / cache_dir_raw)
+cache_max_size_mb = config.getfloat("cache", "max_size_mb", fallback=512.0)
+
+# Job journal: queued file jobs survive restarts and crashes
+journal_enabled = config.getboolean("journal", "enabled", fallback=True)
+journal_path_raw = config.get("journal", "path", fallback="tmp/journal.db")
+journal_path = journal_path_raw if os.path.isabs(journal_path_raw) else str(PROJECT_ROOT / journal_path_raw)
+journal_max_attempts = config.getint("journal", "max_attempts", fallback=3)
+journal_keep_days = config.getfloat("journal", "keep_days", fallback=7.0)
+
+# Watch folders: new media files dropped into these directories are queued automatically
+watch_enabled = config.getboolean("watch", "enabled", fallback=False)
+watch_directories = [
+    directory.strip() for directory in config.get("watch", "directories", fallback="").split(";") if directory.strip()
+]
+watch_recursive = config.getboolean("watch", "recursive", fallback=True)
+watch_poll_seconds = config.getfloat("watch", "poll_seconds", fallback=2.0)
+watch_settle_seconds = config.getfloat("watch", "settle_seconds", fallback=3.0)
+watch_ingest_existing = config.getboolean("watch", "ingest_existing", fallback=True)
+watch_index_raw = config.get("watch", "index", fallback="tmp/watch/index.db")
+watch_index_path = watch_index_raw if os.path.isabs(watch_index_raw) else str(PROJECT_ROOT / watch_index_raw)
+
+# Manifest bulk mode: index of finished manifest entries, so re-runs skip them
+manifest_index_raw = config.get("manifest", "index", fallback="tmp/manifest.db")
+manifest_index_path = manifest_index_raw if os.path.isabs(manifest_index_raw) else str(PROJECT_ROOT / manifest_index_raw)
+
+# Recording archive: finished recordings are compressed out of base_dir and expired by retention limits
+archive_enabled = config.getboolean("archive", "enabled", fallback=False)
+archive_format = config.get("archive", "format", fallback="flac").strip().lower()
+archive_opus_bitrate = config.get("archive", "opus_bitrate", fallback="24k").strip()
+archive_dir_raw = config.get("archive", "directory", fallback="archive")
+archive_dir = archive_dir_raw if os.path.isabs(archive_dir_raw) else os.path.join(base_dir, archive_dir_raw)
+archive_index_raw = config.get("archive", "index", fallback="tmp/archive.db")
+archive_index_path = archive_index_raw if os.path.isabs(archive_index_raw) else str(PROJECT_ROOT / archive_index_raw)
+archive_min_age_minutes = config.getfloat("archive", "min_age_minutes", fallback=30.0)
+archive_interval_minutes = config.getfloat("archive", "interval_minutes", fallback=10.0)
+archive_keep_days = config.getfloat("archive", "keep_days", fallback=0.0)
+archive_max_count = config.getint("archive", "max_count", fallback=0)
+archive_max_total_mb = config.getfloat("archive", "max_total_mb", fallback=0.0)
+
+# Voice-activity trimming: drop dead air at the edges and shorten long pauses before transcription
+vad_enabled = config.getboolean("vad", "enabled", fallback=False)
+vad_threshold = config.getfloat("vad", "threshold", fallback=300.0)
+vad_frame_ms = config.getfloat("vad", "frame_ms", fallback=30.0)
+vad_padding_ms = config.getfloat("vad", "padding_ms", fallback=200.0)
+vad_max_pause_seconds = config.getfloat("vad", "max_pause_seconds", fallback=1.0)
+vad_keep_pause_seconds = config.getfloat("vad", "keep_pause_seconds", fallback=0.4)
+if vad_max_pause_seconds < 0:
+    print(f"[vad] max_pause_seconds must not be negative, not {vad_max_pause_seconds:g}; using 1.")
+    vad_max_pause_seconds = 1.0
+if not 0 <= vad_keep_pause_seconds <= vad_max_pause_seconds:
+    # A kept pause longer than the pauses it replaces would overlap the spans and repeat audio
+    print(f"[vad] keep_pause_seconds ({vad_keep_pause_seconds:g}) must be between 0 and max_pause_seconds "
+          f"({vad_max_pause_seconds:g}); using {min(max(vad_keep_pause_seconds, 0.0), vad_max_pause_seconds):g}.")
+    vad_keep_pause_seconds = min(max(vad_keep_pause_seconds, 0.0), vad_max_pause_seconds)
+
+# Automatic model routing (--model auto)
+routing_models = [
+    model.strip() for model in config.get(
+        "routing", "models", fallback="large-v3-turbo, distil-large-v3, medium, base"
+    ).split(",") if model.strip() in MODELS
+] or list(reversed(MODELS))
+routing_fragment_budget = config.getfloat("routing", "fragment_budget_seconds", fallback=1.5)
+routing_dictation_budget = config.getfloat("routing", "dictation_budget_seconds", fallback=4.0)
+routing_one_word_budget = config.getfloat("routing", "one_word_budget_seconds", fallback=6.0)
+routing_batch_max_rtf = config.getfloat("routing", "batch_max_rtf", fallback=0.5)
+routing_busy_queue_depth = config.getint("routing", "busy_queue_depth", fallback=3)
+routing_min_samples = config.getint("routing", "min_samples", fallback=5)
+
+# Metrics: per-stage latency histograms, exposed as JSON lines and/or a local HTTP endpoint
+metrics_enabled = config.getboolean("metrics", "enabled", fallback=False)
+metrics_file_raw = config.get("metrics", "file", fallback="tmp/metrics.jsonl")
+metrics_file = (
+    metrics_file_raw if not metrics_file_raw or os.path.isabs(metrics_file_raw) else str(PROJECT_ROOT / metrics_file_raw)
+)
+metrics_http_port = config.getint("metrics", "http_port", fallback=0)
+metrics_snapshot_seconds = config.getfloat("metrics", "snapshot_seconds", fallback=10.0)
+
+# Job API: local HTTP endpoint for other tools to submit files or PCM and follow their jobs
+api_enabled = config.getboolean("api", "enabled", fallback=False)
+api_port = config.getint("api", "port", fallback=8765)
+api_token = config.get("api", "token", fallback="").strip()
+api_max_upload_mb = config.getfloat("api", "max_upload_mb", fallback=256.0)
+
+# Output settings
+persist_artifacts = config.getboolean("output", "persist_artifacts", fallback=True)
+output_formats = [
+    fmt.strip().lower() for fmt in config.get("output", "formats", fallback="srt, txt").split(",") if fmt.strip()
+]
+
+# Audio capture settings: 16 kHz mono matches what Whisper consumes, so nothing has to be resampled
+def parse_device(value):
+    """Device pinning from config: an index, a (partial) device name, or empty for the system default."""
+    value = value.strip()
+    if not value:
+        return None
+    return int(value) if value.isdigit() else value
+
+
+def parse_latency(value):
+    """sounddevice latency: 'low', 'high' or a number of seconds."""
+    value = value.strip().lower()
+    if value in ("low", "high"):
+        return value
+    return float(value)
+
+
+capture_sample_rate = config.getint("audio", "sample_rate", fallback=16000)
+capture_channels = config.getint("audio", "channels", fallback=1)
+capture_blocksize = config.getint("audio", "blocksize", fallback=0)  # 0 lets PortAudio choose
+capture_latency = parse_latency(config.get("audio", "latency", fallback="high"))
+capture_device = parse_device(config.get("audio", "device", fallback=""))
+capture_buffer_seconds = config.getfloat("audio", "buffer_seconds", fallback=60.0)
+# Warm capture: the input stream stays open between recordings and keeps a pre-roll
+warm_capture_enabled = config.getboolean("audio", "warm_stream", fallback=False)
+capture_preroll_seconds = config.getfloat("audio", "preroll_seconds", fallback=0.5)
+# Spill to disk: recordings are streamed into their WAV while captured, memory stays bounded
+spill_enabled = config.getboolean("audio", "spill_to_disk", fallback=False)
+spill_ring_seconds = config.getfloat("audio", "spill_ring_seconds", fallback=10.0)
+
+# Streaming settings: recordings are cut at pauses and transcribed while still recording
+streaming_enabled = config.getboolean("streaming", "enabled", fallback=False)
+stream_pause_seconds = config.getfloat("streaming", "pause_seconds", fallback=0.6)
+stream_min_segment_seconds = config.getfloat("streaming", "min_segment_seconds", fallback=3.0)
+stream_silence_threshold = config.getfloat("streaming", "silence_threshold", fallback=300.0)
+
+os.makedirs(base_dir, exist_ok=True)  # Create a directory if it does not already exist
+
+# Global state management
+class State:
+    IDLE = "IDLE"
+    RECORDING = "RECORDING"
+    PROCESSING = "PROCESSING"
+    WAITING = "WAITING"
+
+
+# Job priorities: lower values are transcribed first
+PRIORITY_INTERACTIVE = 0  # Hotkey / tray recordings
+PRIORITY_BATCH = 10  # Clipboard scanner and CLI files
+
+
+def normalize_queue_item(item):
+    """Returns a queue item as (path, skip_clipboard, queued_at, job_options) with a private options dict."""
+    if not isinstance(item, tuple):
+        item = (item,)
+    path = str(item[0])
+    skip_clipboard = item[1] if len(item) > 1 else False
+    queued_at = item[2] if len(item) > 2 else time.time()
+    job_options = dict(item[3]) if len(item) > 3 else {}
+    # Model, language and modes are fixed when the job is queued (recordings bring the settings
+    # they were started with), so live switches never change a job that is already under way
+    job_options.setdefault("settings", current_job_settings())
+    return (path, skip_clipboard, queued_at, job_options)
+
+
+def current_job_settings():
+    """The settings a job queued right now will be transcribed with."""
+    return {
+        "model": model_selected,
+        "language": language_selected,
+        "one_mode": one_mode,
+        "fragment_mode": fragment_mode,
+        "beep_off": beep_off,
+    }
+
+
+class JobQueue:
+    """Priority queue of transcription jobs with the Queue API the workers rely on.
+
+    Lower priority values run first, equal priorities keep FIFO order. Every job gets an id
+    (stored in its options as "job_id") so queued jobs can be cancelled or reprioritized.
+    """
+
+    def __init__(self):
+        self.heap = []  # [priority, sequence, job_id, item]; item is None once removed
+        self.entries = {}  # job_id -> live heap entry
+        self.sequence = itertools.count()
+        self.job_ids = itertools.count(1)
+        self.unfinished_tasks = 0
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.all_tasks_done = threading.Condition(self.mutex)
+        self.journal = None  # JobJournal recording jobs that can be resumed after a restart
+
+    def put(self, item, priority=PRIORITY_BATCH):
+        """Queues a job and returns its id.
+
+        Requeued items keep their job_id and sequence, so they return to their original place.
+        """
+        item = normalize_queue_item(item)
+        job_options = item[3]
+        if self.journal is not None and "journal_id" not in job_options:
+            job_options["journal_id"] = self.journal.add(item, priority)
+        with self.mutex:
+            job_id = job_options.get("job_id") or next(self.job_ids)
+            sequence = job_options.get("sequence")
+            if sequence is None:
+                sequence = next(self.sequence)
+            job_options.update(job_id=job_id, sequence=sequence, priority=priority)
+            entry = [priority, sequence, job_id, item]
+            self.entries[job_id] = entry
+            heapq.heappush(self.heap, entry)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        return job_id
+
+    def reserve_id(self):
+        """A job id for a job that needs it before it is queued (pass it as job_options["job_id"])."""
+        with self.mutex:
+            return next(self.job_ids)
+
+    def get(self):
+        with self.not_empty:
+            while True:
+                while not self.heap:
+                    self.not_empty.wait()
+                entry = heapq.heappop(self.heap)
+                if entry[3] is not None:
+                    del self.entries[entry[2]]
+                    return entry[3]
+
+    def _finish_task(self):
+        self.unfinished_tasks -= 1
+        if self.unfinished_tasks <= 0:
+            self.all_tasks_done.notify_all()
+
+    def task_done(self):
+        with self.mutex:
+            self._finish_task()
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+
+    def empty(self):
+        with self.mutex:
+            return not self.entries
+
+    def qsize(self):
+        with self.mutex:
+            return len(self.entries)
+
+    def cancel(self, job_id):
+        """Removes a queued job; returns its item, or None if it is not queued."""
+        with self.mutex:
+            entry = self.entries.pop(job_id, None)
+            if entry is None:
+                return None
+            item, entry[3] = entry[3], None
+            self._finish_task()
+            return item
+
+    def reprioritize(self, job_id, priority):
+        """Moves a queued job to a new priority, keeping its original position among equals."""
+        with self.mutex:
+            entry = self.entries.get(job_id)
+            if entry is None:
+                return False
+            new_entry = [priority, entry[1], job_id, entry[3]]
+            new_entry[3][3]["priority"] = priority
+            entry[3] = None
+            self.entries[job_id] = new_entry
+            heapq.heappush(self.heap, new_entry)
+            return True
+
+    def snapshot(self):
+        """Queued jobs in scheduling order as (job_id, priority, path)."""
+        with self.mutex:
+            entries = sorted(self.entries.values())
+        return [(entry[2], entry[0], entry[3][0]) for entry in entries]
+
+
+recording_thread = None
+copy_to_clipboard = False
+fragment_mode = False
+default_fragment_mode = False  # New global for tray setting
+one_mode = False
+default_one_mode = False  # New global for tray setting
+file_scanner_enabled = False  # Toggle for clipboard processing
+use_timestamp = False
+model_selected = "base"
+language_selected = None
+beep_off = False
+timestamp_str = ""
+audio_file_path = ""
+output_srt_path = ""
+output_txt_path = ""
+icon = None
+last_click_time = 0
+show_stats = False # Flag for execution timing logging
+engine = None  # Primary TranscriptionEngine, created in main()
+engines = []  # One engine per pool worker (engines[0] is the primary engine)
+jobs_in_flight = 0
+worker_status = {}  # worker name -> status line
+running_jobs = {}  # job id -> {"worker", "engine", "options", "started"}
+transcription_cache = None  # TranscriptionCache, created in main() unless disabled
+model_router = None  # ModelRouter, created in main()
+prefetcher = None  # Prefetcher, created in main() when prefetch is enabled
+job_journal = None  # JobJournal, created in main() unless disabled
+thread_profiles = None  # ThreadProfiles of this host, loaded in main()
+recording_archive = None  # RecordingArchive, created in main() when archiving is enabled
+warm_capture = None  # WarmCapture, created in main() when the input stream stays open
+capture_wake = threading.Event()  # Wakes record_audio() when the recording stops or a stream cut is queued
+recording_stopped_at = 0.0  # perf_counter() of the last stop, for the stop_to_queue latency
+worker_lock = threading.Lock()
+
+# Priority queue of audio files for transcription
+transcription_queue = JobQueue()
+icon_update_queue = Queue()
+tray = False  # Set in main(); state changes only queue icon updates while the tray runs
+# Queue of (audio_file_path, segments, pcm, sample_rate) to persist after the clipboard is filled
+artifact_queue = Queue()
+
+
+class AppController:
+    """Application state machine shared by the hotkeys, the tray, the recorder and the workers.
+
+    Transitions are atomic: a guarded transition checks and changes the state under one lock,
+    so e.g. a finishing worker can never switch a recording that just started back to IDLE.
+    Subscribers are called with (old_state, new_state, changed_at) after every change, in
+    order and while the lock is held, so they must be quick and must not transition.
+    """
+
+    def __init__(self):
+        self.state = State.IDLE
+        self.changed_at = time.perf_counter()
+        self.lock = threading.Lock()
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def transition(self, new_state, expect=None, unless=None):
+        """Switches to new_state and returns True, unless the current state is not in expect
+        (when given) or is in unless; then nothing changes and False is returned.
+
+        new_state can also be a function returning the state; it is called under the lock, so
+        a target that depends on other state (see settle_state()) is checked and set at once.
+        """
+        with self.lock:
+            old_state = self.state
+            if (expect is not None and old_state not in expect) or (unless is not None and old_state in unless):
+                return False
+            if callable(new_state):
+                new_state = new_state()
+            if old_state == new_state:
+                return True
+            self.state = new_state
+            changed_at = time.perf_counter()
+            previous_change, self.changed_at = self.changed_at, changed_at
+            for callback in self.subscribers:
+                try:
+                    callback(old_state, new_state, changed_at - previous_change)
+                except Exception as e:
+                    print(f"[State] Subscriber error: {e}")
+            return True
+
+
+controller = AppController()
+
+
+def settle_state():
+    """After work or a recording ended: PROCESSING while jobs remain, otherwise IDLE.
+
+    A recording or a console prompt that started in the meantime is left alone. The queue is
+    checked under the controller's lock, so a job queued (and PROCESSING set) between the check
+    and the transition can't be overwritten with IDLE. Nothing transitions while holding
+    worker_lock or the queue's lock, so taking them inside the controller's lock is safe.
+    """
+    def settled():
+        with worker_lock:
+            busy = jobs_in_flight > 0 or not transcription_queue.empty()
+        return State.PROCESSING if busy else State.IDLE
+
+    controller.transition(settled, unless=(State.RECORDING, State.WAITING))
+
+
+STATE_COLORS = {State.IDLE: "blue", State.RECORDING: "red", State.PROCESSING: "yellow", State.WAITING: "gray"}
+icon_images = {}  # color -> PIL image, built once
+
+
+def icon_image(color):
+    image = icon_images.get(color)
+    if image is None:
+        image = icon_images[color] = Image.new("RGB", (16, 16), color)
+    return image
+
+
+def on_state_icon(old_state, new_state, elapsed):
+    # The tray call can be slow on some platforms, so it happens on the icon thread
+    if tray:
+        icon_update_queue.put(STATE_COLORS[new_state])
+
+
+def on_state_capture(old_state, new_state, elapsed):
+    global recording_stopped_at
+    if old_state == State.RECORDING:
+        recording_stopped_at = time.perf_counter()
+        capture_wake.set()  # The recorder is waiting for exactly this
+
+
+def on_state_metrics(old_state, new_state, elapsed):
+    metrics.observe(f"state_{old_state.lower()}", elapsed, {})  # Time spent in the old state
+
+
+def on_state_console(old_state, new_state, elapsed):
+    if show_stats:
+        print(f"[State] {old_state} -> {new_state} after {elapsed:.2f}s")
+
+
+for subscriber in (on_state_capture, on_state_icon, on_state_metrics, on_state_console):
+    controller.subscribe(subscriber)
+
+
+def update_icon():
+    global icon
+    while True:
+        color = icon_update_queue.get()
+        if icon is not None:
+            icon.icon = icon_image(color)
+        icon_update_queue.task_done()
+
+
+def notify_error(message):
+    """Prints an error and, when the tray runs, shows it as a notification (where the platform supports it)."""
+    print(f"Error: {message}")
+    if icon is not None:
+        try:
+            icon.notify(message, "Whisper")
+        except Exception:
+            pass  # Not every pystray backend has notifications; the console line stays
+
+
+# --- Audio Capture ---
+def write_wav(path, sample_rate, pcm):
+    """Writes int16 PCM (frames, or frames x channels) as a WAV file without copying it."""
+    pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1 if pcm.ndim == 1 else pcm.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+
+
+class AudioBuffer:
+    """Preallocated int16 frame buffer written from the audio callback.
+
+    Linear mode grows by doubling when full, so the callback never allocates per block.
+    Ring mode keeps a fixed capacity and overwrites the oldest frames.
+    """
+
+    def __init__(self, capacity_frames, channels=1, ring=False):
+        self.data = np.zeros((max(1, int(capacity_frames)), channels), dtype=np.int16)
+        self.ring = ring
+        self.length = 0  # Frames held
+        self.write_pos = 0  # Ring mode: next frame to overwrite
+
+    @property
+    def capacity(self):
+        return len(self.data)
+
+    def clear(self):
+        self.length = 0
+        self.write_pos = 0
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        data = np.zeros((capacity, self.data.shape[1]), dtype=np.int16)
+        data[:self.length] = self.data[:self.length]
+        self.data = data
+
+    def write(self, block):
+        frames = len(block)
+        if not self.ring:
+            if self.length + frames > self.capacity:
+                self._grow(self.length + frames)
+            self.data[self.length:self.length + frames] = block
+            self.length += frames
+            return
+
+        capacity = self.capacity
+        if frames >= capacity:
+            self.data[:] = block[-capacity:]
+            self.write_pos = 0
+            self.length = capacity
+            return
+        first = min(frames, capacity - self.write_pos)
+        self.data[self.write_pos:self.write_pos + first] = block[:first]
+        self.data[:frames - first] = block[first:]
+        self.write_pos = (self.write_pos + frames) % capacity
+        self.length = min(capacity, self.length + frames)
+
+    def view(self, start=0, end=None):
+        """Returns frames [start:end] in recording order (a view in linear mode, a copy in ring mode)."""
+        end = self.length if end is None else min(end, self.length)
+        if not self.ring or self.length < self.capacity:
+            return self.data[start:end]
+        ordered = np.concatenate((self.data[self.write_pos:], self.data[:self.write_pos]), axis=0)
+        return ordered[start:end]
+
+
+class SpillWriter:
+    """Streams a recording into its WAV file while it is captured.
+
+    The callback copies blocks into a fixed ring (no allocation, no disk access) and a writer
+    thread appends them to the file. Memory stays at the ring size however long the recording
+    runs. The RIFF header is rewritten every header_interval seconds, so after a crash the WAV
+    is valid up to the last update. view() maps the written frames instead of reading them.
+    """
+
+    HEADER_BYTES = 44
+
+    def __init__(self, path, sample_rate, channels=1, ring_seconds=10.0, header_interval=1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.ring = np.zeros((max(1, int(ring_seconds * sample_rate)), channels), dtype=np.int16)
+        self.header_interval = header_interval
+        self.length = 0  # Frames received from the callback
+        self.written = 0  # Frames appended to the file
+        self.dropped = 0  # Frames lost because the disk fell a whole ring behind
+        self.closed = False
+        self.error = None
+        self.pending = threading.Event()
+        self.progress = threading.Condition()
+        self.file = open(path, "wb")
+        self._write_header(0)
+        self.thread = threading.Thread(target=self._run, name="spill-writer", daemon=True)
+        self.thread.start()
+
+    def _write_header(self, frames):
+        data_bytes = frames * self.channels * 2
+        self.file.seek(0)
+        self.file.write(b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE")
+        self.file.write(b"fmt " + struct.pack(
+            "<IHHIIHH", 16, 1, self.channels, self.sample_rate, self.sample_rate * self.channels * 2, self.channels * 2, 16
+        ))
+        self.file.write(b"data" + struct.pack("<I", data_bytes))
+        self.file.seek(0, os.SEEK_END)
+
+    def write(self, block):
+        """Called from the audio callback: copies block into the ring and wakes the writer."""
+        capacity = len(self.ring)
+        frames = len(block)
+        start = self.length % capacity
+        first = min(frames, capacity - start)
+        self.ring[start:start + first] = block[:first]
+        if frames > first:
+            self.ring[:frames - first] = block[first:frames]
+        self.length += frames
+        self.pending.set()
+
+    def _drain(self):
+        """Appends everything received so far; returns False when there was nothing to write."""
+        capacity = len(self.ring)
+        end = self.length
+        if end == self.written:
+            return False
+        if end - self.written > capacity:
+            # The callback lapped the writer: keep the file's timeline by filling the gap with silence
+            lost = end - capacity - self.written
+            self.file.write(bytes(lost * self.channels * 2))
+            self.dropped += lost
+            self.written += lost
+        start = self.written % capacity
+        frames = end - self.written
+        first = min(frames, capacity - start)
+        self.file.write(self.ring[start:start + first].tobytes())
+        if frames > first:
+            self.file.write(self.ring[:frames - first].tobytes())
+        self.file.flush()
+        with self.progress:
+            self.written = end
+            self.progress.notify_all()
+        return True
+
+    def _run(self):
+        last_header = time.perf_counter()
+        try:
+            while True:
+                self.pending.wait(self.header_interval)
+                self.pending.clear()
+                closing = self.closed
+                self._drain()
+                if time.perf_counter() - last_header >= self.header_interval:
+                    self._write_header(self.written)
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                    last_header = time.perf_counter()
+                if closing:
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.progress:
+                self.closed = True
+                self.progress.notify_all()
+
+    def view(self, start=0, end=None):
+        """Returns frames [start:end] as a read-only memory map, once the writer has stored them."""
+        end = self.length if end is None else min(end, self.length)
+        with self.progress:
+            self.progress.wait_for(lambda: self.written >= end or self.error is not None)
+        if self.error is not None:
+            raise self.error
+        if end <= start:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        return np.memmap(
+            self.path, dtype=np.int16, mode="r",
+            offset=self.HEADER_BYTES + start * self.channels * 2, shape=(end - start, self.channels),
+        )
+
+    def close(self):
+        """Writes the remaining frames and the final header; the WAV is complete afterwards."""
+        self.closed = True
+        self.pending.set()
+        self.thread.join()
+        try:
+            if self.error is None:
+                self._drain()
+                self._write_header(self.written)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+        if self.error is not None:
+            raise self.error
+        if self.dropped:
+            print(f"[Capture] Disk too slow: {self.dropped / self.sample_rate:.2f}s replaced by silence.")
+
+
+class WarmCapture:
+    """Keeps one input stream open between recordings.
+
+    While idle the callback only refreshes a small ring buffer (the pre-roll). Starting a
+    recording hands the pre-roll to the new recording and redirects the callback, so there is
+    no device open latency and speech from just before the hotkey is kept.
+    """
+
+    def __init__(self, sample_rate, preroll_seconds):
+        self.sample_rate = sample_rate
+        self.preroll = AudioBuffer(max(1, int(preroll_seconds * sample_rate)), capture_channels, ring=True)
+        self.preroll_enabled = preroll_seconds > 0
+        self.lock = threading.Lock()
+        self.target = None  # Callback of the running recording
+        self.stream = None
+
+    def open(self):
+        self.stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            channels=capture_channels,
+            dtype="int16",
+            blocksize=capture_blocksize,
+            latency=capture_latency,
+            device=capture_device,
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        with self.lock:
+            if self.target is not None:
+                self.target(indata, frames, time_info, status)
+            elif self.preroll_enabled:
+                self.preroll.write(indata)
+
+    def begin(self, callback):
+        """Routes captured blocks to callback, starting with the pre-roll; returns the pre-roll frames."""
+        if self.stream is None or not self.stream.active:
+            # The device went away (or was never opened): start over with a fresh stream
+            self.close()
+            self.open()
+        with self.lock:
+            preroll_frames = self.preroll.length
+            if preroll_frames:
+                callback(self.preroll.view(), preroll_frames, None, None)
+                self.preroll.clear()
+            self.target = callback
+        return preroll_frames
+
+    def end(self, callback):
+        with self.lock:
+            if self.target is callback:  # The next recording may already have begun
+                self.target = None
+
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+
+
+def record_audio(sample_rate=None, recording_path=None, settings=None):
+    sample_rate = sample_rate or capture_sample_rate
+    # Locals, not globals: the next recording may start while this one is still being queued
+    recording_path = recording_path or audio_file_path
+    # The settings at the start of the recording; switches while recording or queueing apply to the next one
+    settings = settings or current_job_settings()
+    stop_key = hotkey_fragment if settings["fragment_mode"] else hotkey
+    print(f"\nRecording started... Press {stop_key} again to stop.")
+    
+    # State is already set to RECORDING by on_activate before this thread starts
+    if spill_enabled:
+        # The recording is its WAV file from the first block; views are memory maps of it
+        audio_buffer = SpillWriter(recording_path, sample_rate, capture_channels, spill_ring_seconds)
+    else:
+        audio_buffer = AudioBuffer(capture_buffer_seconds * sample_rate, capture_channels)
+    timings = {}  # Capture-side stage timings, handed to the job
+
+    # Streaming mode: the callback only marks pause positions, segments are dispatched from this thread
+    session = StreamSession(recording_path, sample_rate) if streaming_enabled else None
+    if session is not None:
+        session.settings = settings
+    segmenter = PauseSegmenter(sample_rate) if session is not None else None
+    stream_cuts = Queue()
+
+    def callback(indata, frames, time, status):
+        audio_buffer.write(indata)
+        if segmenter is not None and segmenter.feed(indata):
+            stream_cuts.put(audio_buffer.length)
+            capture_wake.set()
+
+    def dispatch_stream_cuts():
+        while not stream_cuts.empty():
+            session.submit_part(audio_buffer.view(session.next_frame, stream_cuts.get()))
+
+    def wait_for_stop():
+        # Sleeps until the controller leaves RECORDING; the callback also wakes it for stream cuts
+        while controller.state == State.RECORDING:
+            capture_wake.wait()
+            capture_wake.clear()
+            if session is not None:
+                dispatch_stream_cuts()
+        return recording_stopped_at
+
+    try:
+        open_started = time.perf_counter()
+        capture_wake.clear()
+        if warm_capture is not None and sample_rate == warm_capture.sample_rate:
+            preroll_frames = warm_capture.begin(callback)
+            metrics.observe("capture_open", time.perf_counter() - open_started, timings)
+            if preroll_frames:
+                print(f"[Capture] Kept {preroll_frames / sample_rate:.2f}s of pre-roll.")
+            try:
+                stop_requested = wait_for_stop()
+            finally:
+                stop_started = time.perf_counter()
+                warm_capture.end(callback)
+        else:
+            with sd.InputStream(
+                samplerate=sample_rate,
+                channels=capture_channels,
+                dtype="int16",
+                blocksize=capture_blocksize,
+                latency=capture_latency,
+                device=capture_device,
+                callback=callback,
+            ):
+                metrics.observe("capture_open", time.perf_counter() - open_started, timings)
+                stop_requested = wait_for_stop()
+                stop_started = time.perf_counter()
+        if spill_enabled:
+            audio_buffer.close()
+            if not audio_buffer.length:
+                os.remove(recording_path)
+        metrics.observe("capture_stop", time.perf_counter() - stop_started, timings)
+
+        if session is not None:
+            # Only the tail after the last pause is left to transcribe
+            dispatch_stream_cuts()
+            session.submit_part(audio_buffer.view(session.next_frame))
+            # In memory mode the full recording is persisted later by the artifact writer
+            session.close(audio_buffer.view() if in_memory_handoff and not spill_enabled else None)
+
+        if audio_buffer.length:
+            # Voice-activity trimming: the engine gets compacted PCM, the WAV keeps the full recording
+            vad_options = {}
+            if vad_enabled and session is None:
+                with metrics.stage("vad", timings):
+                    compacted, time_map, trimmed = compact_silence(audio_buffer.view(), sample_rate)
+                if time_map is not None:
+                    print(f"[VAD] Trimmed {trimmed:.1f}s of silence ({len(compacted) / sample_rate:.1f}s left).")
+                    vad_options = {"pcm": compacted, "sample_rate": sample_rate, "time_map": time_map, "trimmed": trimmed}
+
+            if in_memory_handoff:
+                # PCM goes straight to the engine; the WAV is written after the clipboard is filled
+                if session is None:
+                    job_options = {
+                        "pcm": audio_buffer.view(), "sample_rate": sample_rate, "timings": timings, "settings": settings,
+                    }
+                    if spill_enabled:
+                        job_options["wav_pcm"] = None  # Already on disk, the PCM is a map of the WAV
+                    if vad_options:
+                        job_options.update(vad_options, wav_pcm=None if spill_enabled else audio_buffer.view())
+                    queue_interactive((recording_path, False, time.time(), job_options))
+                    metrics.observe("stop_to_queue", time.perf_counter() - stop_requested, timings)
+            else:
+                wav_written = None if spill_enabled else threading.Event()
+                if session is None:
+                    # Tuple: (path, skip_clipboard, queued_at, job_options)
+                    job_options = {"timings": timings, "settings": settings}
+                    if vad_options:
+                        job_options.update(vad_options, wav_pcm=None)  # The WAV is written below
+                    if wav_written is not None:
+                        # Queued before the WAV is written; the worker waits for the file
+                        job_options["wav_written"] = wav_written
+                    queue_interactive((recording_path, False, time.time(), job_options))
+                    metrics.observe("stop_to_queue", time.perf_counter() - stop_requested, timings)
+                if wav_written is not None:
+                    try:
+                        with metrics.stage("wav_write", timings):
+                            write_wav(recording_path, sample_rate, audio_buffer.view())
+                    finally:
+                        wav_written.set()
+                print(f"Recording saved to {recording_path}")
+        else:
+            print("No audio data recorded.")
+        settle_state()
+
+    except Exception as e:
+        print(f"An error occurred during recording: {e}")
+        if session is not None:
+            session.close()
+        if spill_enabled and not audio_buffer.file.closed:
+            try:
+                audio_buffer.close()  # Keeps what was captured as a valid WAV
+            except Exception:
+                pass
+        settle_state()
+
+
+def format_srt_timestamp(seconds):
+    """Formats seconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    millis = int(round(max(0.0, seconds) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def write_srt(segments, srt_path):
+    """Writes a list of {"start", "end", "text"} segments as an SRT file."""
+    with open(srt_path, "w", encoding="utf-8") as srt_file:
+        writer = SrtWriter(srt_file)
+        for index, segment in enumerate(segments, start=1):
+            writer.write(index, segment)
+
+
+def parse_srt_timestamp(value):
+    """Parses an SRT timestamp (HH:MM:SS,mmm) into seconds."""
+    hours, minutes, rest = value.strip().replace(".", ",").split(":")
+    secs, millis = rest.split(",")
+    return int(hours) * 3600 + int(minutes) * 60 + int(secs) + int(millis) / 1000.0
+
+
+def parse_srt(srt_path):
+    """Reads an SRT file into a list of {"start", "end", "text"} segments."""
+    segments = []
+    with open(srt_path, "r", encoding="utf-8") as srt_file:
+        blocks = srt_file.read().replace("\r\n", "\n").split("\n\n")
+    for block in blocks:
+        lines = [line for line in block.split("\n") if line.strip()]
+        for i, line in enumerate(lines):
+            if "-->" in line:
+                start, end = line.split("-->")
+                segments.append({
+                    "start": parse_srt_timestamp(start),
+                    "end": parse_srt_timestamp(end.split()[0]),
+                    "text": "\n".join(text.strip() for text in lines[i + 1:]),
+                })
+                break
+    return segments
+
+
+# --- Transcript Writers ---
+# A segment is {"start": seconds, "end": seconds, "text": str}, plus "words" (a list of
+# {"start", "end", "text"}) when the engine provides word timestamps. Segments are produced
+# once from the engine's output; every format is written from them in a single pass.
+class TranscriptWriter:
+    """Writes one transcript format, fed one segment at a time."""
+    extension = None
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+    def begin(self):
+        pass
+
+    def write(self, index, segment):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+class SrtWriter(TranscriptWriter):
+    extension = "srt"
+
+    def write(self, index, segment):
+        self.output_file.write(
+            f"{index}\n{format_srt_timestamp(segment['start'])} --> {format_srt_timestamp(segment['end'])}\n"
+            f"{segment['text']}\n\n"
+        )
+
+
+class TxtWriter(TranscriptWriter):
+    """Spoken text only, one segment per line (a cue whose text is a number is still text)."""
+    extension = "txt"
+
+    def begin(self):
+        self.first = True
+
+    def write(self, index, segment):
+        if not segment["text"]:
+            return
+        self.output_file.write(segment["text"] if self.first else "\n" + segment["text"])
+        self.first = False
+
+
+class VttWriter(TranscriptWriter):
+    extension = "vtt"
+
+    def begin(self):
+        self.output_file.write("WEBVTT\n\n")
+
+    def write(self, index, segment):
+        start = format_srt_timestamp(segment["start"]).replace(",", ".")
+        end = format_srt_timestamp(segment["end"]).replace(",", ".")
+        self.output_file.write(f"{index}\n{start} --> {end}\n{segment['text']}\n\n")
+
+
+class JsonWriter(TranscriptWriter):
+    """{"segments": [...]}, streamed segment by segment."""
+    extension = "json"
+
+    def begin(self):
+        self.output_file.write('{"segments": [')
+
+    def write(self, index, segment):
+        self.output_file.write(("\n  " if index == 1 else ",\n  ") + json.dumps(segment, ensure_ascii=False))
+
+    def end(self):
+        self.output_file.write("\n]}\n")
+
+
+TRANSCRIPT_WRITERS = {writer.extension: writer for writer in (SrtWriter, TxtWriter, VttWriter, JsonWriter)}
+
+
+def transcript_formats(formats=None):
+    return [fmt for fmt in (formats or output_formats) if fmt in TRANSCRIPT_WRITERS] or ["srt", "txt"]
+
+
+def transcript_target(audio_file_path, settings):
+    """The audio path as seen from the transcripts' folder (the job's output_dir, if any)."""
+    target = str(audio_file_path)
+    if settings.get("output_dir"):
+        target = os.path.join(settings["output_dir"], os.path.basename(target))
+    return target
+
+
+def transcript_base(audio_file_path, settings, formats):
+    """Base path (no extension) for a job's transcripts.
+
+    They go next to the audio unless the job has an output_dir. Jobs with overwrite (manifest
+    entries) always use filename[.language] and replace earlier output; others get a new name.
+    """
+    language = settings.get("language")
+    target = transcript_target(audio_file_path, settings)
+    if settings.get("overwrite"):
+        return f"{os.path.splitext(target)[0]}{f'.{language}' if language else ''}"
+    return get_unique_output_base(target, language, formats)
+
+
+def identical_transcripts_base(segments, audio_file_path, settings, formats):
+    """Base of an existing set of transcripts that already holds exactly these segments, or None.
+
+    Checks filename[.N][.language] the way get_unique_output_base() numbers them, so a re-run
+    from the cache finds the output of the run it came from.
+    """
+    buffers = [io.StringIO() for _ in formats]
+    writers = [TRANSCRIPT_WRITERS[fmt](buffer) for fmt, buffer in zip(formats, buffers)]
+    for writer in writers:
+        writer.begin()
+    for index, segment in enumerate(segments, start=1):
+        for writer in writers:
+            writer.write(index, segment)
+    for writer in writers:
+        writer.end()
+    expected = [buffer.getvalue() for buffer in buffers]
+
+    language = settings.get("language")
+    stem = os.path.splitext(transcript_target(audio_file_path, settings))[0]
+    for counter in itertools.count():
+        base = f"{stem}{f'.{counter}' if counter else ''}{f'.{language}' if language else ''}"
+        paths = [f"{base}.{fmt}" for fmt in formats]
+        if not any(os.path.exists(path) for path in paths):
+            return None  # get_unique_output_base() would pick this one; nothing further up exists
+        try:
+            if all(Path(path).read_text(encoding="utf-8") == text for path, text in zip(paths, expected)):
+                return base
+        except (OSError, UnicodeDecodeError):
+            continue
+
+
+def write_transcripts(segments, audio_file_path, settings=None, formats=None):
+    """Writes all configured formats for audio_file_path in one pass and returns the spoken lines.
+
+    settings are the job's settings (language postfix, output_dir, overwrite). With
+    reuse_identical (cache hits), transcripts that already hold these segments are kept
+    instead of written again under a new name.
+    """
+    formats = transcript_formats(formats)
+    settings = settings or {}
+    if settings.get("output_dir"):
+        os.makedirs(settings["output_dir"], exist_ok=True)
+    if settings.get("reuse_identical") and not settings.get("overwrite"):
+        base = identical_transcripts_base(segments, audio_file_path, settings, formats)
+        if base is not None:
+            print(f"Transcription unchanged: {base}.{formats[0]}")
+            return [segment["text"] for segment in segments if segment["text"]]
+    base = transcript_base(audio_file_path, settings, formats)
+    paths = [f"{base}.{fmt}" for fmt in formats]
+    files = []
+    try:
+        for path in paths:
+            files.append(open(path, "w", encoding="utf-8"))
+        writers = [TRANSCRIPT_WRITERS[fmt](output_file) for fmt, output_file in zip(formats, files)]
+        for writer in writers:
+            writer.begin()
+        spoken_lines = []
+        for index, segment in enumerate(segments, start=1):
+            for writer in writers:
+                writer.write(index, segment)
+            if segment["text"]:
+                spoken_lines.append(segment["text"])
+        for writer in writers:
+            writer.end()
+    finally:
+        for output_file in files:
+            output_file.close()
+    for path in paths:
+        print(f"Transcription written: {path}")
+    return spoken_lines
+
+
+# --- Voice-Activity Trimming ---
+class TimeMap:
+    """Maps times in compacted audio back to the original recording.
+
+    spans are the kept (start, end) frame ranges of the original audio, in order.
+    """
+
+    def __init__(self, spans, sample_rate):
+        self.original_starts = [start / float(sample_rate) for start, _ in spans]
+        self.compacted_starts = []
+        position = 0
+        for start, end in spans:
+            self.compacted_starts.append(position / float(sample_rate))
+            position += end - start
+
+    def to_original(self, seconds, is_end=False):
+        # An end time exactly on a seam belongs to the span before it, a start time to the one after
+        find = bisect.bisect_left if is_end else bisect.bisect_right
+        index = max(0, find(self.compacted_starts, seconds) - 1)
+        return self.original_starts[index] + (seconds - self.compacted_starts[index])
+
+    def remap(self, segments):
+        """Returns copies of the segments (and their words, if any) on the original timeline."""
+        remapped = []
+        for segment in segments:
+            segment = dict(segment, start=self.to_original(segment["start"]), end=self.to_original(segment["end"], True))
+            if segment.get("words"):
+                segment["words"] = [
+                    dict(word, start=self.to_original(word["start"]), end=self.to_original(word["end"], True))
+                    for word in segment["words"]
+                ]
+            remapped.append(segment)
+        return remapped
+
+
+def find_voiced_spans(audio, sample_rate):
+    """Frame ranges to keep: speech plus padding, with long pauses shortened. None if all silent."""
+    frame = max(1, int(sample_rate * vad_frame_ms / 1000))
+    mono = audio.mean(axis=1) if audio.ndim > 1 else audio
+    count = len(mono) // frame
+    if count == 0:
+        return None
+    frames = mono[:count * frame].astype(np.float32).reshape(count, frame)
+    voiced = np.sqrt((frames ** 2).mean(axis=1)) > vad_threshold
+    if not voiced.any():
+        return None
+
+    # Pad speech on both sides so soft onsets and endings survive
+    padding = int(round(vad_padding_ms / vad_frame_ms))
+    if padding:
+        voiced = np.convolve(voiced, np.ones(2 * padding + 1), mode="same") > 0
+
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Pauses up to max_pause are kept whole; longer ones shrink to keep_pause (half on each side)
+    frame_seconds = frame / float(sample_rate)
+    max_pause = int(vad_max_pause_seconds / frame_seconds)
+    keep_half = int(vad_keep_pause_seconds / frame_seconds / 2)
+    long_gaps = (starts[1:] - ends[:-1]) > max_pause
+    span_starts = np.concatenate(([starts[0]], starts[1:][long_gaps] - keep_half))
+    span_ends = np.concatenate((ends[:-1][long_gaps] + keep_half, [ends[-1]]))
+
+    spans = [(int(start) * frame, int(end) * frame) for start, end in zip(span_starts, span_ends)]
+    if span_ends[-1] >= count:
+        spans[-1] = (spans[-1][0], len(audio))  # Speech runs into the partial last frame
+    return spans
+
+
+def compact_silence(audio, sample_rate):
+    """Trims leading/trailing silence and compresses long pauses.
+
+    Returns (compacted audio, TimeMap, seconds removed), or (audio, None, 0.0) when nothing
+    would be removed or the recording has no detectable speech.
+    """
+    spans = find_voiced_spans(audio, sample_rate)
+    if not spans:
+        return audio, None, 0.0
+    kept = sum(end - start for start, end in spans)
+    if kept >= len(audio):
+        return audio, None, 0.0
+    compacted = np.concatenate([audio[start:end] for start, end in spans])
+    return compacted, TimeMap(spans, sample_rate), (len(audio) - kept) / float(sample_rate)
+
+
+# --- Streaming Transcription ---
+class PauseSegmenter:
+    """Energy-based pause detector fed from the audio callback.
+
+    feed() returns True when a pause long enough to cut a segment has just been seen.
+    """
+
+    def __init__(self, sample_rate):
+        self.pause_frames = int(stream_pause_seconds * sample_rate)
+        self.min_segment_frames = int(stream_min_segment_seconds * sample_rate)
+        self.segment_frames = 0
+        self.silent_frames = 0
+        self.heard_speech = False
+
+    def feed(self, block):
+        frames = len(block)
+        self.segment_frames += frames
+        rms = np.sqrt(np.mean(np.square(block, dtype=np.float32)))
+        if rms < stream_silence_threshold:
+            self.silent_frames += frames
+        else:
+            self.silent_frames = 0
+            self.heard_speech = True
+
+        if (
+            self.heard_speech
+            and self.silent_frames >= self.pause_frames
+            and self.segment_frames >= self.min_segment_frames
+        ):
+            self.segment_frames = 0
+            self.silent_frames = 0
+            self.heard_speech = False
+            return True
+        return False
+
+
+class StreamSession:
+    """Partial transcriptions of one streamed recording, stitched into the final output on completion."""
+
+    def __init__(self, audio_file_path, sample_rate):
+        self.audio_file_path = audio_file_path
+        self.sample_rate = sample_rate
+        self.next_frame = 0  # First frame not yet submitted
+        self.parts = {}  # part index -> (offset seconds, part wav path)
+        self.results = {}  # part index -> segments
+        self.failures = {}  # part index -> (state, error) of parts that failed or were cancelled
+        self.closed = False
+        self.finalized = False
+        self.full_audio = None
+        self.settings = current_job_settings()  # Every part uses the settings of the recording's start
+        self.lock = threading.Lock()
+
+    def submit_part(self, part_audio):
+        """Queues the given frames as the next part (as PCM in memory mode, otherwise as a part WAV)."""
+        if not len(part_audio):
+            return
+        index = len(self.parts)
+        offset = self.next_frame / float(self.sample_rate)
+        self.next_frame += len(part_audio)
+
+        part_path = f"{os.path.splitext(self.audio_file_path)[0]}.part{index}.wav"
+        job_options = {"stream": self, "part": index, "settings": self.settings}
+        if in_memory_handoff:
+            job_options.update(pcm=part_audio, sample_rate=self.sample_rate)
+        else:
+            write_wav(part_path, self.sample_rate, part_audio)
+        with self.lock:
+            self.parts[index] = (offset, part_path)
+        print(f"[Stream] Part {index} queued ({offset:.1f}s + {len(part_audio) / self.sample_rate:.1f}s).")
+        queue_interactive((part_path, True, time.time(), job_options))
+
+    def close(self, full_audio=None):
+        """Marks the recording as finished; stitches immediately if all parts are already done.
+
+        full_audio is the complete recording when it still has to be persisted (memory mode).
+        """
+        with self.lock:
+            self.closed = True
+            self.full_audio = full_audio
+        self._finalize_if_complete()
+
+    def complete_part(self, index, segments, state="done", error=None):
+        """Stores the segments of one part; an empty list and the part's state when it failed or was cancelled."""
+        with self.lock:
+            self.results[index] = segments
+            if state != "done":
+                self.failures[index] = (state, error)
+        self._finalize_if_complete()
+
+    def _finalize_if_complete(self):
+        with self.lock:
+            if self.finalized or not self.closed or len(self.results) < len(self.parts):
+                return
+            self.finalized = True
+
+        segments = []
+        for index in sorted(self.parts):
+            offset, part_path = self.parts[index]
+            for segment in self.results[index]:
+                segment = dict(segment, start=segment["start"] + offset, end=segment["end"] + offset)
+                if self._keep_segment(index, segment):
+                    segments.append(segment)
+            if part_path and os.path.exists(part_path):
+                os.remove(part_path)
+
+        if not self.parts:
+            return
+
+        if self.failures:
+            self._fail()
+            return
+        segments.sort(key=lambda segment: segment["start"])
+        print(f"[Stream] Stitched {len(segments)} segment(s) from {len(self.parts)} part(s).")
+        self._deliver(segments)
+
+    def _keep_segment(self, index, segment):
+        """Streamed parts don't overlap, every segment is kept."""
+        return True
+
+    def failure_summary(self):
+        """(state, error) for the whole session: cancelled if any part was, otherwise failed."""
+        states = {state for state, _error in self.failures.values()}
+        error = "; ".join(
+            f"part {index}: {error}" for index, (_state, error) in sorted(self.failures.items()) if error
+        ) or None
+        return ("cancelled" if "cancelled" in states else "failed"), error
+
+    def _fail(self):
+        """A dictation with a gap is not pasted; the recording is kept so it can be transcribed again."""
+        state, error = self.failure_summary()
+        if self.full_audio is not None:
+            try:
+                write_wav(self.audio_file_path, self.sample_rate, self.full_audio)
+            except Exception as e:
+                print(f"Failed to save recording {self.audio_file_path}: {e}")
+        notify_error(
+            f"{len(self.failures)} of {len(self.parts)} part(s) of the recording {state}; nothing was copied. "
+            f"The recording is kept at {self.audio_file_path}."
+        )
+        if error:
+            print(f"[Stream] {error}")
+
+    def _deliver(self, segments):
+        finish_transcription(
+            self.audio_file_path, segments, False, self.full_audio, self.sample_rate, settings=self.settings
+        )
+
+
+# --- Long-File Chunking ---
+def get_media_duration(path):
+    """Duration of a media file in seconds: WAV header, otherwise ffprobe (0.0 if unknown)."""
+    if str(path).lower().endswith(".wav"):
+        return get_wav_duration(path)
+    ffprobe_path = os.path.join(os.path.dirname(ffmpeg_path), os.path.basename(ffmpeg_path).replace("ffmpeg", "ffprobe"))
+    try:
+        result = subprocess.run(
+            [ffprobe_path, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+            check=True, capture_output=True, text=True,
+        )
+        return float(result.stdout.strip() or 0.0)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Could not determine duration of {path}: {e}")
+        return 0.0
+
+
+def decode_media(path, sample_rate=16000):
+    """Decodes any media file to mono int16 PCM with ffmpeg (WAV files at the right rate are read directly)."""
+    if str(path).lower().endswith(".wav"):
+        with wave.open(str(path), "rb") as wav_file:
+            if (
+                wav_file.getframerate() == sample_rate
+                and wav_file.getnchannels() == 1
+                and wav_file.getsampwidth() == 2
+            ):
+                return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+    result = subprocess.run(
+        [ffmpeg_path, "-nostdin", "-v", "error", "-i", str(path),
+         "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"],
+        check=True, capture_output=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def find_silence_cuts(audio, sample_rate, chunk_seconds, search_seconds):
+    """Cut positions (frames) roughly every chunk_seconds, moved to the quietest 100 ms within +-search_seconds."""
+    frame = max(1, sample_rate // 10)
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return []
+    energy = np.square(audio[:frame_count * frame].reshape(frame_count, frame), dtype=np.float32).mean(axis=1)
+
+    frames_per_second = sample_rate / float(frame)
+    chunk_frames = int(chunk_seconds * frames_per_second)
+    search_frames = int(search_seconds * frames_per_second)
+    cuts = []
+    target = chunk_frames
+    # Stop early enough that the last chunk is not a sliver
+    while target < frame_count - chunk_frames // 4:
+        # Every chunk is at least half the chunk length, however wide the search window
+        low = max(target - search_frames, target - chunk_frames + max(1, chunk_frames // 2))
+        high = min(target + search_frames, frame_count - chunk_frames // 4)
+        cut_frame = low + int(np.argmin(energy[low:high])) if low < high else target
+        cuts.append(cut_frame * frame + frame // 2)
+        target = cut_frame + chunk_frames
+    return cuts
+
+
+class ChunkedSession(StreamSession):
+    """Overlapping chunks of one long media file, transcribed in parallel by the worker pool.
+
+    Each chunk owns the span between its silence cuts; segments from the overlap are kept only
+    by the chunk that owns their midpoint, so nothing is duplicated at the seams.
+    """
+
+    def __init__(self, audio_file_path, sample_rate, skip_clipboard, cache_key=None):
+        super().__init__(audio_file_path, sample_rate)
+        self.skip_clipboard = skip_clipboard
+        self.cache_key = cache_key
+        self.owned = {}  # part index -> (start, end) seconds owned by the chunk
+        self.api_job = None  # ApiJob of the parent job; gets each chunk's segments as they finish
+        self.journal_id = None  # Journal entry of the parent job, done once the chunks are stitched
+        self.manifest = None  # Manifest entry of the parent job, recorded once the chunks are stitched
+        self.started = time.time()
+
+    def submit_chunk(self, chunk_audio, offset_frames, owned_start, owned_end, priority):
+        index = len(self.parts)
+        offset = offset_frames / float(self.sample_rate)
+        with self.lock:
+            self.parts[index] = (offset, None)
+            self.owned[index] = (owned_start, owned_end)
+        job_options = {
+            "stream": self, "part": index, "pcm": chunk_audio, "sample_rate": self.sample_rate, "settings": self.settings,
+        }
+        chunk_id = transcription_queue.put((f"{self.audio_file_path}#chunk{index}", True, time.time(), job_options), priority)
+        if self.api_job is not None:
+            self.api_job.children.append(chunk_id)
+
+    def complete_part(self, index, segments, state="done", error=None):
+        if self.api_job is not None and segments:
+            offset = self.parts[index][0]
+            shifted = [dict(segment, start=segment["start"] + offset, end=segment["end"] + offset) for segment in segments]
+            self.api_job.update(segments=[segment for segment in shifted if self._keep_segment(index, segment)])
+        super().complete_part(index, segments, state, error)
+
+    def _keep_segment(self, index, segment):
+        owned_start, owned_end = self.owned[index]
+        midpoint = (segment["start"] + segment["end"]) / 2.0
+        return owned_start <= midpoint < owned_end
+
+    def _fail(self):
+        """Finishes the parent job as failed (or cancelled) when a chunk did; a gapped transcript is not a result."""
+        state, error = self.failure_summary()
+        print(f"[Long File] {self.audio_file_path}: {len(self.failures)} of {len(self.parts)} chunk(s) {state}; "
+              f"no transcript written.")
+        self._finish_parent(state, error)
+
+    def _finish_parent(self, state, error=None):
+        if self.api_job is not None:
+            self.api_job.update(state=state, error=error)
+        if self.journal_id is not None and job_journal is not None:
+            job_journal.finish(self.journal_id, state, error)
+        if self.manifest is not None:
+            self.manifest[0].finish(
+                self.manifest, self.audio_file_path, state, self.settings, error, process=time.time() - self.started
+            )
+
+    def _deliver(self, segments):
+        if self.cache_key is not None and transcription_cache is not None:
+            transcription_cache.put(self.cache_key, segments)
+        try:
+            spoken_lines = write_transcripts(segments, self.audio_file_path, self.settings)
+        except Exception as e:
+            print(f"[Long File] Failed to write transcripts for {self.audio_file_path}: {e}")
+            self._finish_parent("failed", f"Failed to write transcripts: {e}")
+            return
+        if self.api_job is not None:
+            self.api_job.update(state="done", segments=segments, replace=True)
+        if self.journal_id is not None and job_journal is not None:
+            job_journal.finish(self.journal_id, "done")
+        copy_transcription(spoken_lines, self.skip_clipboard, self.settings["fragment_mode"])
+        if self.manifest is not None:
+            self.manifest[0].finish(
+                self.manifest, self.audio_file_path, "done", self.settings, process=time.time() - self.started
+            )
+
+
+def queue_long_file_chunks(audio_file_path, skip_clipboard, job_options, cache_key, sample_rate=16000, audio=None):
+    """Decodes a long media file (unless already prefetched) and queues its chunks.
+
+    The session stitches them when all are done.
+    """
+    if audio is None:
+        print(f"[Long File] Decoding {audio_file_path}...")
+        audio = decode_media(audio_file_path, sample_rate)
+    cuts = find_silence_cuts(audio, sample_rate, long_chunk_seconds, long_search_seconds)
+    bounds = [0] + cuts + [len(audio)]
+    overlap_frames = int(long_overlap_seconds * sample_rate)
+
+    session = ChunkedSession(audio_file_path, sample_rate, skip_clipboard, cache_key)
+    session.settings = job_options["settings"]  # Chunks inherit the parent job's model and language
+    session.api_job = job_options.get("api_job")
+    session.journal_id = job_options.get("journal_id")
+    session.manifest = job_options.get("manifest")
+    for index in range(len(bounds) - 1):
+        start = max(0, bounds[index] - overlap_frames)
+        end = min(len(audio), bounds[index + 1] + overlap_frames)
+        owned_start = bounds[index] / float(sample_rate)
+        owned_end = bounds[index + 1] / float(sample_rate) if index < len(bounds) - 2 else float("inf")
+        session.submit_chunk(audio[start:end], start, owned_start, owned_end, job_options.get("priority", PRIORITY_BATCH))
+    print(f"[Long File] {audio_file_path}: {len(audio) / sample_rate:.0f}s split into {len(bounds) - 1} chunk(s).")
+    session.close()
+
+
+def finish_transcription(audio_file_path, segments, skip_clipboard, pcm=None, sample_rate=None, persist=None,
+                         settings=None, background=True):
+    """Fills the clipboard first, then hands the WAV/SRT/TXT artifacts to the background writer.
+
+    pcm is only given for recordings that still need their WAV. persist overrides
+    [output] persist_artifacts (batch files always get their transcripts). settings are
+    the job's settings (language postfix, Fragment Mode); defaults to the current ones.
+    With background=False the artifacts are written before returning and a failure raises,
+    so it fails the job (API jobs, whose clients are told where the files are).
+    """
+    settings = settings or current_job_settings()
+    spoken_lines = [segment["text"] for segment in segments if segment["text"]]
+    copy_transcription(spoken_lines, skip_clipboard, settings["fragment_mode"])
+    if persist_artifacts if persist is None else persist:
+        if background:
+            artifact_queue.put((audio_file_path, segments, pcm, sample_rate, settings))
+        else:
+            with metrics.stage("output_write"):
+                write_artifacts(audio_file_path, segments, pcm, sample_rate, settings)
+
+
+def write_artifacts(audio_file_path, segments, pcm, sample_rate, settings):
+    if pcm is not None:
+        write_wav(audio_file_path, sample_rate, pcm)
+        print(f"Recording saved to {audio_file_path}")
+    write_transcripts(segments, audio_file_path, settings)
+
+
+def run_artifact_writer():
+    """Persists recordings and transcripts off the latency-critical path."""
+    while True:
+        audio_file_path, segments, pcm, sample_rate, settings = artifact_queue.get()
+        write_started = time.perf_counter()
+        try:
+            write_artifacts(audio_file_path, segments, pcm, sample_rate, settings)
+        except Exception as e:
+            print(f"Failed to persist artifacts for {audio_file_path}: {e}")
+        finally:
+            metrics.observe("artifact_write", time.perf_counter() - write_started)
+            artifact_queue.task_done()
+
+
+# --- Transcription Engines ---
+class EngineError(Exception):
+    """Raised when a transcription backend fails outside of the whisper-faster process itself."""
+
+
+class TranscriptionEngine:
+    """Base class for transcription backends.
+
+    options is a dict with model, language, one_mode, beep_off and threads.
+    """
+    name = "base"
+
+    supports_pcm = False  # True when transcribe_pcm() never touches the disk
+    keeps_models = False  # True when models stay loaded, with the thread count they were loaded with
+
+    def transcribe(self, audio_file_path, output_dir, options):
+        """Transcribes audio_file_path and returns the path of the SRT written to output_dir."""
+        raise NotImplementedError
+
+    def transcribe_segments(self, audio_file_path, output_dir, options):
+        """Transcribes audio_file_path and returns a list of segments.
+
+        Backends that only produce SRT files have theirs parsed once and removed.
+        """
+        srt_path = self.transcribe(audio_file_path, output_dir, options)
+        if not os.path.exists(srt_path):
+            raise EngineError(f"Transcription output {srt_path} was not created.")
+        with metrics.stage("srt_parse"):
+            segments = parse_srt(srt_path)
+        os.remove(srt_path)
+        return segments
+
+    def transcribe_pcm(self, pcm, sample_rate, options):
+        """Transcribes int16 PCM frames and returns a list of segments.
+
+        Backends that can only read files fall back to a temporary WAV round-trip.
+        """
+        temp_output_dir = str(PROJECT_ROOT / "tmp")
+        os.makedirs(temp_output_dir, exist_ok=True)
+        wav_path = os.path.join(temp_output_dir, f"pcm-{threading.get_ident()}-{time.time_ns()}.wav")
+        write_wav(wav_path, sample_rate, pcm)
+        try:
+            return self.transcribe_segments(wav_path, temp_output_dir, options)
+        finally:
+            os.remove(wav_path)
+
+    def cancel(self):
+        """Interrupts the running transcription; returns False if the backend can't be interrupted."""
+        return False
+
+    def prewarm(self, model, threads=None):
+        """Loads model ahead of the next job; returns False if the backend loads per job."""
+        return False
+
+    def health_check(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class SubprocessEngine(TranscriptionEngine):
+    """Classic backend: one whisper-faster process (and model load) per job."""
+    name = "subprocess"
+
+    def __init__(self, executable, model_dir):
+        self.executable = executable
+        self.model_dir = model_dir
+        self.process = None
+
+    def transcribe(self, audio_file_path, output_dir, options):
+        srt_command = [
+            self.executable,
+            audio_file_path,
+            "--task",
+            "transcribe",
+            "--model",
+            options["model"],
+            "--model_dir",
+            self.model_dir,
+            "--output_dir",
+            output_dir,
+            "--output_format",
+            "srt",
+            "--threads",
+            str(options.get("threads", 8))
+        ]
+
+        # ONE-WORD MODE vs SENTENCE SPLITTING
+        if options.get("one_mode"):
+             srt_command.extend(["--one_word", "2"])
+        else:
+             srt_command.append("--sentence")
+
+        if options.get("language") is not None:
+            srt_command.extend(["--language", options["language"]])
+        if options.get("beep_off"):
+            srt_command.append("--beep_off")
+
+        print(
+            f"\nFull command to execute transcription: \n{' '.join(srt_command)}\n"
+        )
+        with metrics.stage("engine_spawn"):
+            self.process = subprocess.Popen(
+                srt_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            )
+        try:
+            # Model load, decoding and inference all happen inside whisper-faster
+            with metrics.stage("engine_process"):
+                stdout, stderr = self.process.communicate()
+        finally:
+            returncode = self.process.returncode
+            self.process = None
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, srt_command, stdout, stderr)
+
+        # Expected name from whisper-faster (based on input filename)
+        input_basename = os.path.basename(os.path.splitext(audio_file_path)[0])
+        return os.path.join(output_dir, f"{input_basename}.srt")
+
+    def cancel(self):
+        process = self.process
+        if process is None:
+            return False
+        process.terminate()
+        return True
+
+
+class ResidentEngine(TranscriptionEngine):
+    """Keeps a long-lived engine_worker.py process with models loaded.
+
+    Talks JSON lines over the worker's stdin/stdout, restarts the worker if it
+    crashes and retries the interrupted request once.
+    """
+    name = "resident"
+    supports_pcm = True
+    keeps_models = True
+
+    def __init__(self, python_executable, model_dir, backend="faster-whisper", preload=None,
+                 startup_timeout=300.0, max_restarts=3, preload_threads=None):
+        self.python_executable = python_executable
+        self.model_dir = model_dir
+        self.backend = backend
+        self.preload = preload
+        self.preload_threads = preload_threads
+        self.startup_timeout = startup_timeout
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.process = None
+        self.responses = None
+        self.request_id = 0
+        self.cancelled = False
+        self.busy = False  # A request is in flight; cancel() only kills the worker then
+        self.lock = threading.Lock()
+        self.cancel_lock = threading.Lock()  # Guards busy/cancelled between _call() and cancel()
+
+    def _start(self):
+        command = [
+            self.python_executable,
+            str(PROJECT_ROOT / "engine_worker.py"),
+            "--backend",
+            self.backend,
+            "--model_dir",
+            self.model_dir,
+        ]
+        if self.preload:
+            command.extend(["--preload", self.preload])
+            if self.preload_threads:
+                command.extend(["--threads", str(self.preload_threads)])
+        print(f"[Engine] Starting resident worker: {' '.join(command)}")
+        # stderr is inherited so worker logs show up in our console
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.responses = Queue()
+        reader = threading.Thread(
+            target=self._read_responses, args=(self.process, self.responses), daemon=True
+        )
+        reader.start()
+        ready = self._wait_response(self.startup_timeout)
+        if ready.get("event") != "ready":
+            raise EngineError(f"Resident worker failed to start: {ready}")
+
+    @staticmethod
+    def _read_responses(process, responses):
+        for line in process.stdout:
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                continue
+        responses.put(None)  # EOF: worker exited
+
+    def _wait_response(self, timeout):
+        try:
+            response = self.responses.get(timeout=timeout)
+        except Empty:
+            raise EngineError("Resident worker did not respond in time.")
+        if response is None:
+            raise EngineError("Resident worker exited unexpectedly.")
+        return response
+
+    def _stop_process(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait(timeout=5)
+            except Exception:
+                pass
+        self.process = None
+
+    def _restart(self, reason):
+        if self.restarts >= self.max_restarts:
+            raise EngineError(f"Resident worker keeps failing ({reason}); giving up after {self.restarts} restarts.")
+        self.restarts += 1
+        print(f"[Engine] Restarting resident worker ({reason})...")
+        self._stop_process()
+        self._start()
+
+    def _send(self, payload, timeout, data=None):
+        self.request_id += 1
+        payload = dict(payload, id=self.request_id)
+        self.process.stdin.write((json.dumps(payload) + "\n").encode("utf-8"))
+        if data is not None:
+            self.process.stdin.write(data)
+        self.process.stdin.flush()
+        while True:
+            response = self._wait_response(timeout)
+            if response.get("id") == self.request_id:
+                return response
+
+    def _send_interruptible(self, payload, timeout, data=None):
+        """_send() that cancel() may interrupt by killing the worker; returns None if it did."""
+        with self.cancel_lock:
+            self.busy = True
+        try:
+            response = self._send(payload, timeout, data)
+        except (EngineError, OSError):
+            with self.cancel_lock:
+                if not self.cancelled:
+                    self.busy = False
+                    raise
+            response = None
+        with self.cancel_lock:
+            self.busy = False
+            cancelled, self.cancelled = self.cancelled, False
+        if cancelled:
+            # Killed on purpose: the next call starts a fresh worker without using the crash budget
+            self._stop_process()
+            return None
+        return response
+
+    def _call(self, payload, timeout=None, data=None):
+        with self.lock:
+            if self.process is None:
+                self._start()
+            elif self.process.poll() is not None:
+                self._restart(f"exit code {self.process.returncode}")
+            try:
+                response = self._send_interruptible(payload, timeout, data)
+            except (EngineError, OSError) as e:
+                # Crash mid-request: bring the worker back and retry once
+                self._restart(str(e))
+                response = self._send_interruptible(payload, timeout, data)
+            if response is None:
+                raise EngineError("Transcription cancelled.")
+            self.restarts = 0  # The worker answered, so the crash budget starts over
+        if not response.get("ok"):
+            raise EngineError(response.get("error", "Unknown resident worker error."))
+        for stage, seconds in response.get("timings", {}).items():
+            metrics.observe(f"engine_{stage}", seconds)  # Measured inside the worker process
+        return response
+
+    def transcribe_segments(self, audio_file_path, output_dir, options):
+        print(f"[Engine] Resident transcription: {audio_file_path} (model {options['model']})")
+        response = self._call({
+            "cmd": "transcribe",
+            "audio": str(audio_file_path),
+            "model": options["model"],
+            "language": options.get("language"),
+            "one_word": bool(options.get("one_mode")),
+            "threads": options.get("threads"),
+        })
+        return response["segments"]
+
+    def transcribe(self, audio_file_path, output_dir, options):
+        input_basename = os.path.basename(os.path.splitext(audio_file_path)[0])
+        srt_path = os.path.join(output_dir, f"{input_basename}.srt")
+        write_srt(self.transcribe_segments(audio_file_path, output_dir, options), srt_path)
+        return srt_path
+
+    def transcribe_pcm(self, pcm, sample_rate, options):
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        channels = pcm.shape[1] if pcm.ndim > 1 else 1
+        print(f"[Engine] Resident in-memory transcription: {len(pcm) / sample_rate:.1f}s (model {options['model']})")
+        response = self._call({
+            "cmd": "transcribe_pcm",
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "pcm_bytes": pcm.nbytes,
+            "model": options["model"],
+            "language": options.get("language"),
+            "one_word": bool(options.get("one_mode")),
+            "threads": options.get("threads"),
+        }, data=pcm.tobytes())
+        return response["segments"]
+
+    def prewarm(self, model, threads=None):
+        """Loads model into the worker; it stays cached next to the models already loaded."""
+        self._call({"cmd": "load", "model": model, "threads": threads})
+        return True
+
+    def cancel(self):
+        """Kills the worker mid-request; the model is reloaded on the next call."""
+        with self.cancel_lock:
+            process = self.process
+            if not self.busy or process is None or process.poll() is not None:
+                return False  # Nothing running; an idle worker keeps its models
+            self.cancelled = True
+            process.kill()
+        return True
+
+    def health_check(self):
+        """Pings the worker; a dead or hung worker is restarted."""
+        try:
+            self._call({"cmd": "ping"}, timeout=10)
+            return True
+        except EngineError as e:
+            print(f"[Engine] Health check failed: {e}")
+            with self.lock:
+                try:
+                    self._restart("failed health check")
+                except EngineError as restart_error:
+                    print(f"[Engine] {restart_error}")
+                    return False
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                try:
+                    self.process.stdin.write(b'{"cmd": "shutdown"}\n')
+                    self.process.stdin.flush()
+                    self.process.wait(timeout=5)
+                except Exception:
+                    pass
+            self._stop_process()
+
+
+class StubEngine(TranscriptionEngine):
+    """In-process engine with deterministic output, for testing without models."""
+    name = "stub"
+    supports_pcm = True
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.cancel_event = threading.Event()
+
+    def _simulate_work(self):
+        self.cancel_event.clear()
+        if self.latency and self.cancel_event.wait(self.latency):
+            raise EngineError("Transcription cancelled.")
+
+    def transcribe_pcm(self, pcm, sample_rate, options):
+        self._simulate_work()
+        return stub_segments(len(pcm) / float(sample_rate))
+
+    def transcribe_segments(self, audio_file_path, output_dir, options):
+        self._simulate_work()
+        return stub_segments(get_wav_duration(audio_file_path))
+
+    def transcribe(self, audio_file_path, output_dir, options):
+        input_basename = os.path.basename(os.path.splitext(audio_file_path)[0])
+        srt_path = os.path.join(output_dir, f"{input_basename}.srt")
+        write_srt(self.transcribe_segments(audio_file_path, output_dir, options), srt_path)
+        return srt_path
+
+    def cancel(self):
+        self.cancel_event.set()
+        return True
+
+
+ENGINE_BACKENDS = ("subprocess", "resident", "stub")
+
+
+def create_engine(backend, preload=True):
+    """Builds the configured transcription backend; preload loads the selected model on a resident engine."""
+    if backend == "resident":
+        preload_model = model_selected if preload and model_selected != MODEL_AUTO else None
+        # The worker keeps a model at the thread count it was loaded with; reloads happen when a job needs another
+        return ResidentEngine(resident_python, model_path, backend=resident_backend, preload=preload_model,
+                              preload_threads=threads_for_job(preload_model, stable=True) if preload_model else None)
+    if backend == "stub":
+        return StubEngine()
+    return SubprocessEngine(whisper_faster_path, model_path)
+
+
+def run_engine_health_monitor():
+    """Periodically checks the engines so a crashed resident worker is restarted before the next job.
+
+    The first check runs immediately, which also warms up the resident workers.
+    """
+    while True:
+        for worker_engine in list(engines):
+            worker_engine.health_check()
+        time.sleep(health_check_interval)
+
+
+def threads_for_job(model=None, stable=False):
+    """Splits the CPU budget across the jobs that are (or are about to be) running.
+
+    stable is for engines that keep models loaded: they get a fixed cpu_budget // workers, so
+    a model is only reloaded when the configuration changes, not whenever the queue depth does.
+    With a thread profile for model, the job gets the fastest measured count within its share.
+    """
+    if stable:
+        active_jobs = max(1, worker_count)
+    else:
+        with worker_lock:
+            active_jobs = min(worker_count, max(1, jobs_in_flight + transcription_queue.qsize()))
+    budget = max(1, cpu_budget // active_jobs)
+    if model is not None and thread_profiles is not None:
+        return thread_profiles.best_threads(model, budget) or budget
+    return budget
+
+
+def set_worker_status(worker_name, status):
+    with worker_lock:
+        worker_status[worker_name] = status
+
+
+def print_worker_status():
+    """Prints what every pool worker is doing."""
+    with worker_lock:
+        print(f"\n[Workers] {jobs_in_flight} job(s) in flight, {transcription_queue.qsize()} queued, CPU budget {cpu_budget}:")
+        for worker_name in sorted(worker_status):
+            print(f"  {worker_name}: {worker_status[worker_name]}")
+    queued = transcription_queue.snapshot()
+    for job_id, priority, path in queued[:10]:
+        kind = "interactive" if priority < PRIORITY_BATCH else "batch"
+        print(f"  queued #{job_id} [{kind}, priority {priority}]: {path}")
+    if len(queued) > 10:
+        print(f"  ... and {len(queued) - 10} more")
+    print_cache_stats()
+    print_metrics_summary()
+
+
+def print_cache_stats():
+    if transcription_cache is not None:
+        cache_stats = transcription_cache.stats()
+        print(
+            f"[Cache] {cache_stats['entries']} entries, {cache_stats['size'] / 1024 / 1024:.1f} MB, "
+            f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions"
+        )
+
+
+def job_finished():
+    """Updates the in-flight counter and the application state after a job."""
+    global jobs_in_flight
+    with worker_lock:
+        jobs_in_flight -= 1
+    settle_state()
+
+
+def queue_interactive(item):
+    """Queues a live recording ahead of batch work, preempting a batch job if enabled."""
+    job_id = transcription_queue.put(item, PRIORITY_INTERACTIVE)
+    if preempt_batch:
+        preempt_batch_job()
+    return job_id
+
+
+def preempt_batch_job():
+    """Frees a worker for live dictation by interrupting the newest running batch job.
+
+    The interrupted job is requeued by its worker with its original priority and queued_at.
+    """
+    with worker_lock:
+        if jobs_in_flight < worker_count:
+            return  # A worker is free and will pick up the dictation right away
+        candidates = [
+            job for job in running_jobs.values()
+            if job["options"].get("priority", PRIORITY_BATCH) >= PRIORITY_BATCH
+            and not job["options"].get("preempted")
+        ]
+        if not candidates:
+            return
+        victim = max(candidates, key=lambda job: job["started"])  # Least work lost
+        victim["options"]["preempted"] = True
+    if victim["engine"].cancel():
+        print(f"[Scheduler] Preempting batch job {victim['options']['job_id']} on {victim['worker']} for live dictation.")
+    else:
+        victim["options"]["preempted"] = False
+
+
+def cancel_job(job_id):
+    """Cancels a queued or running job. Returns True if the job was found."""
+    item = transcription_queue.cancel(job_id)
+    if item is not None:
+        api_job = item[3].get("api_job")
+        if api_job is not None:
+            api_job.update(state="cancelled")
+        if job_journal is not None and item[3].get("journal_id") is not None:
+            job_journal.finish(item[3]["journal_id"], "cancelled")
+        manifest = item[3].get("manifest")
+        if manifest is not None:
+            manifest[0].finish(manifest, item[0], "cancelled", item[3]["settings"])
+        stream = item[3].get("stream")
+        if stream is not None:
+            stream.complete_part(item[3]["part"], [], "cancelled")
+        prefetch_slot = item[3].get("prefetch")
+        if prefetch_slot is not None:
+            prefetch_slot.claim()  # Stops a pending decode; waits for one in progress
+            prefetcher.release(prefetch_slot)
+        print(f"[Scheduler] Cancelled queued job {job_id}: {item[0]}")
+        settle_state()
+        return True
+    with worker_lock:
+        job = running_jobs.get(job_id)
+        if job is None:
+            return False
+        job["options"]["cancelled"] = True
+    if not job["engine"].cancel():
+        print(f"[Scheduler] Job {job_id} can't be interrupted by the {job['engine'].name} engine; it will finish.")
+    return True
+
+
+def reprioritize_job(job_id, priority, chunk_ids=()):
+    """Changes the priority of a queued job and its queued long-file chunks.
+
+    Work moved ahead of batch jobs may preempt one, like a new dictation.
+    """
+    moved = [queued_id for queued_id in [job_id, *chunk_ids] if transcription_queue.reprioritize(queued_id, priority)]
+    if not moved:
+        return False
+    print(f"[Scheduler] Moved {len(moved)} queued job(s) of job {job_id} to priority {priority}.")
+    if priority < PRIORITY_BATCH and preempt_batch:
+        preempt_batch_job()
+    return True
+
+
+def cancel_batch_jobs():
+    """Cancels every queued batch job (tray menu)."""
+    cancelled = 0
+    for job_id, priority, _path in transcription_queue.snapshot():
+        if priority >= PRIORITY_BATCH and cancel_job(job_id):
+            cancelled += 1
+    print(f"[Scheduler] Cancelled {cancelled} queued batch job(s).")
+
+
+# --- Thread Autotuning ---
+class ThreadProfiles:
+    """Transcription times per model and thread count, measured by --autotune and stored per host.
+
+    One JSON file can serve several machines (e.g. a synced project folder); each only reads its
+    own section. Beyond some count more threads make a model slower (memory bandwidth,
+    hyper-threads), so the fastest count that fits is used rather than the largest.
+    """
+
+    def __init__(self, path, host=None):
+        self.path = path
+        self.host = host or platform.node()
+        self.profiles = self._read().get(self.host, {})  # model -> {"threads": {count: seconds}, ...}
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"[Autotune] Could not read {self.path}: {e}")
+            return {}
+
+    def best_threads(self, model, budget):
+        """Fastest profiled thread count for model that fits budget, or None without a profile."""
+        profile = self.profiles.get(model)
+        if not profile:
+            return None
+        timings = {int(count): seconds for count, seconds in profile["threads"].items() if int(count) <= budget}
+        return min(timings, key=timings.get) if timings else None
+
+    def store(self, model, timings, clip_seconds):
+        self.profiles[model] = {
+            "threads": {str(count): round(seconds, 3) for count, seconds in sorted(timings.items())},
+            "best": min(timings, key=timings.get),
+            "clip_seconds": round(clip_seconds, 2),
+            "cpu_count": os.cpu_count(),
+            "measured": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def save(self):
+        """Writes this host's profiles, keeping the other hosts' sections."""
+        data = self._read()
+        data[self.host] = self.profiles
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        partial = f"{self.path}.partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(partial, self.path)
+
+
+def installed_models():
+    """Models with a faster-whisper-<model> folder in model_directory; all models if none is found."""
+    installed = [model for model in MODELS if os.path.isdir(os.path.join(model_path, f"faster-whisper-{model}"))]
+    return installed or list(MODELS)
+
+
+def autotune_thread_counts():
+    """1, 2, 4, ... up to the core count, plus the core count itself."""
+    cores = os.cpu_count() or 8
+    counts = {cores}
+    count = 1
+    while count < cores:
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def reference_clip():
+    """The configured autotune clip, or a generated 30 s speech-like clip."""
+    if autotune_clip:
+        return autotune_clip
+    path = str(PROJECT_ROOT / "tmp" / "autotune" / "reference.wav")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sample_rate = 16000
+        t = np.arange(30 * sample_rate) / sample_rate
+        # Noise modulated at syllable rate, so the decoder sees speech-like energy and pauses
+        envelope = np.clip(np.sin(2 * np.pi * 0.7 * t), 0, None)
+        audio = np.random.default_rng(0).standard_normal(len(t)) * envelope * 4000
+        write_wav(path, sample_rate, audio.astype(np.int16))
+    print(f"[Autotune] No [processing] autotune_clip set; using a generated clip ({path}). A real recording gives better profiles.")
+    return path
+
+
+def run_autotune(backend):
+    """Times every installed model at each thread count on the reference clip and stores the profiles."""
+    clip = reference_clip()
+    clip_seconds = get_media_duration(clip)
+    counts = autotune_threads or autotune_thread_counts()
+    output_dir = str(PROJECT_ROOT / "tmp" / "autotune")
+    os.makedirs(output_dir, exist_ok=True)
+    profiles = ThreadProfiles(thread_profiles_path)
+    print(f"[Autotune] {profiles.host}: {backend} engine, threads {counts}, {clip_seconds:.1f}s clip, {autotune_repeats} run(s) each.")
+    for model in installed_models():
+        timings = {}
+        for threads in counts:
+            # A fresh engine per count: a resident worker fixes its thread count when it loads a model
+            tune_engine = create_engine(backend, preload=False)
+            options = {"model": model, "language": None, "one_mode": False, "beep_off": True, "threads": threads}
+            try:
+                tune_engine.prewarm(model, threads)
+                if not timings:
+                    tune_engine.transcribe_segments(clip, output_dir, options)  # Warms the disk cache for the model
+                runs = []
+                for _ in range(max(1, autotune_repeats)):
+                    started = time.perf_counter()
+                    tune_engine.transcribe_segments(clip, output_dir, options)
+                    runs.append(time.perf_counter() - started)
+                timings[threads] = min(runs)
+                print(f"[Autotune] {model}: {threads:>3} thread(s) {timings[threads]:7.2f}s "
+                      f"({clip_seconds / timings[threads] if timings[threads] else 0:.1f}x real time)")
+            except Exception as e:
+                print(f"[Autotune] {model} with {threads} thread(s) failed: {e}")
+            finally:
+                tune_engine.close()
+        if timings:
+            profiles.store(model, timings, clip_seconds)
+            print(f"[Autotune] {model}: best {profiles.profiles[model]['best']} thread(s).")
+    profiles.save()
+    print(f"[Autotune] Profiles saved to {thread_profiles_path}")
+
+
+# --- Job Journal ---
+class JobJournal:
+    """SQLite journal of file jobs: queued, running, done, failed or cancelled.
+
+    Only jobs whose audio is a file on disk are journaled; in-memory recordings, streamed
+    parts and long-file chunks can't be rebuilt after a restart (a long file is resumed as
+    a whole). attempts counts how often a run of the job was interrupted by a crash or exit
+    since it was last queued by hand (a preempted job that is requeued doesn't count), retries
+    how often a failed job was queued again with --retry-failed.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.owner_file = None
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, settings TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, skip_clipboard INTEGER NOT NULL, state TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, retries INTEGER NOT NULL DEFAULT 0, error TEXT, "
+                "queued REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+
+    def add(self, item, priority):
+        """Journals a newly queued job; returns its journal id, or None if it can't be resumed."""
+        path, skip_clipboard, queued_at, job_options = item
+        if "stream" in job_options or not (os.path.isfile(path) or "wav_written" in job_options):
+            return None
+        path = os.path.abspath(path)
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (path, settings, priority, skip_clipboard, state, queued, updated) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (path, json.dumps(job_options["settings"]), priority, int(bool(skip_clipboard)), queued_at, time.time()),
+            )
+        return cursor.lastrowid
+
+    def start(self, journal_id):
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                (time.time(), journal_id),
+            )
+
+    def claim(self):
+        """Takes the journal's owner lock for the life of the process; False if another running
+        instance holds it, whose queued and running jobs are then not ours to resume."""
+        self.owner_file = open(f"{self.path}.lock", "a+")
+        try:
+            self.owner_file.seek(0)
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(self.owner_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.owner_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.owner_file.close()
+            self.owner_file = None
+            return False
+
+    def requeue(self, journal_id):
+        """Marks a preempted job as queued again without counting its run as an attempt."""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = 'queued', attempts = MAX(attempts - 1, 0), updated = ? WHERE id = ?",
+                (time.time(), journal_id),
+            )
+
+    def finish(self, journal_id, state, error=None):
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?", (state, error, time.time(), journal_id)
+            )
+
+    def unfinished(self, max_attempts):
+        """Jobs to resume, oldest first. Jobs that were started max_attempts times are marked failed
+        instead, so a file that crashes the app can't do so forever."""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = 'failed', error = ?, updated = ? "
+                "WHERE state IN ('queued', 'running') AND attempts >= ?",
+                (f"Interrupted {max_attempts} times; not resumed again", time.time(), max_attempts),
+            )
+            return self.db.execute(
+                "SELECT id, path, settings, priority, attempts FROM jobs "
+                "WHERE state IN ('queued', 'running') ORDER BY id"
+            ).fetchall()
+
+    def pending_paths(self):
+        """Absolute paths of the jobs that are still queued or running."""
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT path FROM jobs WHERE state IN ('queued', 'running')")}
+
+    def requeue_failed(self):
+        """Marks failed jobs as queued again (--retry-failed); returns how many."""
+        with self.lock, self.db:
+            return self.db.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, retries = retries + 1, updated = ? WHERE state = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def prune(self, keep_days):
+        """Forgets finished jobs older than keep_days."""
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'cancelled') AND updated < ?",
+                (time.time() - keep_days * 86400,),
+            )
+
+    def summary(self):
+        """({state: count}, failed jobs as (id, path, attempts, retries, error))."""
+        with self.lock:
+            counts = dict(self.db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            failed = self.db.execute(
+                "SELECT id, path, attempts, retries, error FROM jobs WHERE state = 'failed' ORDER BY id"
+            ).fetchall()
+        return counts, failed
+
+
+def resume_journal():
+    """Queues the journaled jobs that were still queued or running when the app last stopped.
+
+    Returns the resumed paths. Resumed jobs keep their settings and priority but never fill
+    the clipboard, which has long moved on.
+    """
+    resumed = set()
+    for journal_id, path, settings, priority, attempts in job_journal.unfinished(journal_max_attempts):
+        if not os.path.isfile(path):
+            job_journal.finish(journal_id, "failed", "File no longer exists")
+            continue
+        job_options = {"journal_id": journal_id, "settings": json.loads(settings)}
+        if prefetcher is not None and Path(path).suffix.lower() in prefetch_extensions:
+            job_options["prefetch"] = prefetcher.add(path)
+        transcription_queue.put((path, True, time.time(), job_options), priority)
+        resumed.add(str(Path(path).resolve()))
+    if resumed:
+        print(f"[Journal] Resumed {len(resumed)} unfinished job(s) from the last run.")
+    return resumed
+
+
+def print_journal_summary():
+    counts, failed = job_journal.summary()
+    print(f"[Journal] {journal_path}")
+    for state in ("queued", "running", "done", "failed", "cancelled"):
+        print(f"  {state:<10} {counts.get(state, 0)}")
+    for journal_id, path, attempts, retries, error in failed:
+        print(f"  #{journal_id} {path} ({attempts} attempt(s), {retries} retry(ies)): {error}")
+
+
+# --- Prefetch Pipeline ---
+PREFETCH_SAMPLE_RATE = 16000
+
+
+class PrefetchSlot:
+    """Decoded PCM of one queued batch file, filled ahead of time by the Prefetcher."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = "pending"  # pending -> decoding -> ready/failed, or pending -> claimed
+        self.pcm = None
+        self.content_hash = None  # Hash of the file's bytes for the result cache, taken while prefetching
+        self.size = 0  # Bytes reserved from the memory budget
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def claim(self):
+        """Called by the worker. Returns the prefetched PCM (waiting for a decode in progress),
+        or None when the file was not prefetched and must be read by the engine itself."""
+        with self.lock:
+            if self.state in ("pending", "claimed"):
+                self.state = "claimed"  # Prefetcher will skip it
+                return None
+        self.ready.wait()
+        return self.pcm
+
+
+class Prefetcher:
+    """Decodes queued batch files to PCM in FIFO order, bounded by a memory budget.
+
+    While file N is transcribed, file N+1 is read (e.g. from a slow network share) and decoded,
+    so the engine never waits on I/O or demuxing.
+    """
+
+    def __init__(self, memory_mb):
+        self.budget = int(memory_mb * 1024 * 1024)
+        self.used = 0
+        self.condition = threading.Condition()
+        self.slots = Queue()
+
+    def add(self, path):
+        slot = PrefetchSlot(path)
+        self.slots.put(slot)
+        return slot
+
+    def _reserve(self, size):
+        with self.condition:
+            # A single file larger than the budget is still allowed when nothing else is held
+            while self.used and self.used + size > self.budget:
+                self.condition.wait()
+            self.used += size
+
+    def _adjust(self, delta):
+        with self.condition:
+            self.used += delta
+            self.condition.notify_all()
+
+    def release(self, slot):
+        """Returns the slot's memory to the budget once its job is finished."""
+        with slot.lock:
+            size, slot.size, slot.pcm = slot.size, 0, None
+        if size:
+            self._adjust(-size)
+
+    def run(self):
+        while True:
+            slot = self.slots.get()
+            if slot.state != "pending":
+                continue
+            estimate = int(get_media_duration(slot.path) * PREFETCH_SAMPLE_RATE * 2)
+            self._reserve(estimate)
+            with slot.lock:
+                if slot.state != "pending":
+                    claimed = True
+                else:
+                    claimed = False
+                    slot.state = "decoding"
+                    slot.size = estimate
+            if claimed:
+                self._adjust(-estimate)
+                continue
+            try:
+                if transcription_cache is not None:
+                    # Hashed here so the worker doesn't read the file from a slow share again
+                    slot.content_hash = TranscriptionCache.content_hash(slot.path)
+                pcm = decode_media(slot.path, PREFETCH_SAMPLE_RATE)
+                with slot.lock:
+                    slot.pcm = pcm
+                    slot.size = pcm.nbytes
+                    slot.state = "ready"
+                self._adjust(pcm.nbytes - estimate)
+                print(f"[Prefetch] Decoded {os.path.basename(slot.path)} ({pcm.nbytes / 1024 / 1024:.1f} MB).")
+            except Exception as e:
+                print(f"[Prefetch] Could not decode {slot.path}, the engine will read it directly: {e}")
+                with slot.lock:
+                    slot.size = 0
+                    slot.state = "failed"
+                self._adjust(-estimate)
+            slot.ready.set()
+
+
+def queue_batch_file(path, skip_clipboard):
+    """Queues a batch file (clipboard scanner, CLI) and registers it with the prefetcher."""
+    job_options = {}
+    if prefetcher is not None and Path(path).suffix.lower() in prefetch_extensions:
+        job_options["prefetch"] = prefetcher.add(str(path))
+    return transcription_queue.put((str(path), skip_clipboard, time.time(), job_options))
+
+
+# --- Watch Folders ---
+TRANSCRIPT_EXTENSIONS = {".srt", ".txt", ".vtt", ".json"}
+
+
+def transcribed_stems(names):
+    """Stems that already have a transcript among the file names of one directory.
+
+    "rec.1.en.srt" marks "rec.1.en", "rec.1" and "rec", which covers the counter and language
+    suffixes added by get_unique_output_base().
+    """
+    stems = set()
+    for name in names:
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in TRANSCRIPT_EXTENSIONS:
+            continue
+        while stem:
+            stems.add(stem)
+            stem = stem.rpartition(".")[0]
+    return stems
+
+
+class WatchIndex:
+    """SQLite record of the watched trees, so restarts and rescans don't re-list or re-queue.
+
+    dirs remembers each directory's mtime: a directory whose mtime is unchanged has no new or
+    removed entries and isn't listed again. files remembers the size and mtime each file was
+    queued (or skipped) with.
+    """
+
+    def __init__(self, index_path):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, dir TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL, "
+                "state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+
+    def dir_mtime(self, path):
+        row = self.db.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def subdirs(self, path):
+        return [row[0] for row in self.db.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+
+    def update_dir(self, path, parent, mtime, subdirs):
+        """Stores a freshly listed directory and forgets subdirectories that are gone."""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime) VALUES (?, ?, ?)", (path, parent, mtime))
+            for old in set(self.subdirs(path)) - set(subdirs):
+                self.db.execute(
+                    "DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (old, len(old) + 1, old + os.sep)
+                )
+
+    def known_files(self, directory):
+        """{path: (size, mtime)} for the files recorded directly in directory."""
+        rows = self.db.execute("SELECT path, size, mtime FROM files WHERE dir = ?", (directory,))
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def mark(self, path, size, mtime, state):
+        self.mark_many([(path, size, mtime)], state)
+
+    def mark_many(self, files, state):
+        """Records (path, size, mtime) tuples in one transaction."""
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, size, mtime, state, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, os.path.dirname(path), size, mtime, state, now) for path, size, mtime in files],
+            )
+
+    def counts(self):
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall())
+
+
+class FolderWatcher:
+    """Polls the watch directories and queues new media files once they have finished writing.
+
+    Only directories whose mtime changed are listed again, so a poll of an unchanged tree costs
+    one stat per directory regardless of how many files it holds. A new or changed file is a
+    candidate until its size and mtime have been stable for settle_seconds and it can be opened.
+    """
+
+    def __init__(self, directories, index, recursive=True, settle_seconds=3.0, ingest_existing=True):
+        self.roots = [os.path.abspath(directory) for directory in directories]
+        self.index = index
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self.ingest_existing = ingest_existing
+        self.candidates = {}  # path -> (size, mtime, stable_since)
+
+    def scan(self):
+        """Walks the watched trees, skipping unchanged directories; returns the directories listed."""
+        listed = 0
+        pending = [(root, None) for root in self.roots]
+        while pending:
+            directory, parent = pending.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue  # Removed or unreachable share; tried again on the next poll
+            known_mtime = self.index.dir_mtime(directory)
+            if known_mtime == mtime:
+                if self.recursive:
+                    # Changes deeper down don't touch this directory's mtime
+                    pending.extend((subdir, directory) for subdir in self.index.subdirs(directory))
+                continue
+            listed += 1
+            subdirs = self._list(directory, first_visit=known_mtime is None)
+            if time.time() - mtime < 2:
+                # Coarse mtimes (FAT, SMB) may not change for an entry added in the same tick: list again
+                mtime = 0.0
+            self.index.update_dir(directory, parent, mtime, subdirs)
+            if self.recursive:
+                pending.extend((subdir, directory) for subdir in subdirs)
+        return listed
+
+    def _list(self, directory, first_visit):
+        subdirs = []
+        media = []
+        names = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    names.append(entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        media.append(entry)
+        except OSError as e:
+            print(f"[Watch] Cannot list {directory}: {e}")
+            return subdirs
+
+        known = self.index.known_files(directory)
+        done = transcribed_stems(names)
+        skipped = []
+        for entry in media:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if known.get(entry.path) == (stat.st_size, stat.st_mtime):
+                continue
+            if entry.path not in known and (
+                os.path.splitext(entry.name)[0] in done or (first_visit and not self.ingest_existing)
+            ):
+                # Already transcribed, or present before the folder was watched
+                skipped.append((entry.path, stat.st_size, stat.st_mtime))
+                continue
+            self.candidates.setdefault(entry.path, (stat.st_size, stat.st_mtime, time.time()))
+        if skipped:
+            self.index.mark_many(skipped, "skipped")
+        return subdirs
+
+    def settle(self):
+        """Queues candidates that stopped changing; returns how many were queued."""
+        queued = 0
+        now = time.time()
+        for path, (size, mtime, stable_since) in list(self.candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]  # Deleted or moved away before it settled
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.candidates[path] = (stat.st_size, stat.st_mtime, now)  # Still being written
+                continue
+            if now - stable_since < self.settle_seconds or not self._readable(path):
+                continue
+            del self.candidates[path]
+            self.index.mark(path, size, mtime, "queued")
+            print(f"[Watch] Queued {path}")
+            queue_batch_file(path, True)
+            queued += 1
+        return queued
+
+    @staticmethod
+    def _readable(path):
+        # On Windows a file still open for writing by the copier can't be opened
+        try:
+            with open(path, "rb"):
+                return True
+        except OSError:
+            return False
+
+    def run(self, poll_seconds):
+        known = sum(self.index.counts().values())
+        print(f"[Watch] Watching {', '.join(self.roots)} ({known} file(s) already indexed).")
+        while True:
+            try:
+                with metrics.stage("watch_scan"):
+                    self.scan()
+                queued = self.settle()
+                if queued:
+                    metrics.increment("watch_files_queued", queued)
+            except Exception as e:
+                print(f"[Watch] Error: {e}")
+            # Poll faster while files are settling, so they are picked up right after settle_seconds
+            time.sleep(min(poll_seconds, self.settle_seconds / 2) if self.candidates else poll_seconds)
+
+
+# --- Manifest Bulk Mode ---
+def read_manifest(manifest_path):
+    """Yields (line number, entry or None) from a JSONL or CSV manifest; None marks an unreadable line.
+
+    CSV manifests need a header row with at least a path column.
+    """
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        if manifest_path.lower().endswith(".csv"):
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                yield number, {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            return
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            yield number, entry if isinstance(entry, dict) else None
+
+
+class ManifestIndex:
+    """SQLite record of finished manifest entries.
+
+    The key covers the file's path, size and mtime and every setting that changes the output, so
+    an edited file or a different model is transcribed again. All keys are loaded into a set
+    when a run starts, so checking an entry costs one stat and a set lookup.
+    """
+
+    def __init__(self, index_path):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS done (key TEXT PRIMARY KEY, path TEXT NOT NULL, finished REAL NOT NULL)"
+            )
+
+    def keys(self):
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT key FROM done")}
+
+    def add(self, key, path):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO done (key, path, finished) VALUES (?, ?, ?)", (key, path, time.time()))
+
+    @staticmethod
+    def key(path, stat, settings, formats):
+        fields = [
+            path, stat.st_size, stat.st_mtime_ns, settings["model"], settings["language"], settings["one_mode"],
+            settings.get("output_dir"), sorted(formats),
+        ]
+        return hashlib.sha1(json.dumps(fields).encode("utf-8")).hexdigest()
+
+
+class ManifestRun:
+    """Queues the entries of one manifest and writes a results line for each of them.
+
+    Entries may set model, language and output_dir; anything else uses the current settings.
+    Relative paths are resolved against the manifest's directory. Entries become batch jobs
+    with overwrite set, so a re-run replaces their transcripts instead of adding .1, .2.
+    Manifest jobs are not journaled: the skip index already makes a re-run resume the manifest.
+    """
+
+    def __init__(self, manifest_path, results_path, index):
+        self.manifest_path = os.path.abspath(manifest_path)
+        self.results_path = results_path
+        self.index = index
+        self.formats = transcript_formats()
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.results = open(results_path, "w", encoding="utf-8")
+
+    def entry_settings(self, entry):
+        """Job settings for a manifest entry; raises ValueError for an unknown model or language."""
+        settings = current_job_settings()
+        model = entry.get("model") or settings["model"]
+        if model not in MODELS + [MODEL_AUTO]:
+            raise ValueError(f"Unknown model: {model}")
+        language = entry.get("language") or settings["language"]
+        if language not in [code for code, _ in LANGUAGES] + [None]:
+            raise ValueError(f"Unknown language: {language}")
+        output_dir = entry.get("output_dir") or None
+        if output_dir and not os.path.isabs(output_dir):
+            output_dir = os.path.join(os.path.dirname(self.manifest_path), output_dir)
+        return dict(settings, model=model, language=language, output_dir=output_dir, overwrite=True)
+
+    def outputs(self, path, settings):
+        base = transcript_base(path, settings, self.formats)
+        return [f"{base}.{fmt}" for fmt in self.formats]
+
+    def record(self, line, path, status, settings=None, error=None, **timings):
+        result = {"line": line, "path": path, "status": status}
+        if settings is not None:
+            result.update(model=settings["model"], language=settings["language"], output_dir=settings.get("output_dir"))
+            if status in ("done", "skipped"):
+                result["outputs"] = self.outputs(path, settings)
+        result.update({name: round(value, 3) for name, value in timings.items() if value is not None})
+        if error:
+            result["error"] = error
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.results.write(json.dumps(result) + "\n")
+            self.results.flush()
+
+    def queue(self):
+        """Queues the unfinished entries; returns how many were queued."""
+        done_keys = self.index.keys()
+        seen = {}  # (real path, first output file) -> line of the entry that was taken
+        queued = 0
+        for line, entry in read_manifest(self.manifest_path):
+            if entry is None or not entry.get("path"):
+                self.record(line, None, "invalid", error="Not a JSON object with a path")
+                continue
+            path = os.path.abspath(os.path.join(os.path.dirname(self.manifest_path), entry["path"]))
+            try:
+                settings = self.entry_settings(entry)
+                stat = os.stat(path)
+            except (ValueError, OSError) as e:
+                self.record(line, path, "invalid" if isinstance(e, ValueError) else "missing", error=str(e))
+                continue
+            # The same file written to the same place twice would run twice and race for its transcripts
+            target = (os.path.realpath(path), self.outputs(path, settings)[0])
+            if target in seen:
+                self.record(line, path, "duplicate", settings, error=f"Same file and output as line {seen[target]}")
+                continue
+            seen[target] = line
+            key = ManifestIndex.key(path, stat, settings, self.formats)
+            if key in done_keys and os.path.exists(self.outputs(path, settings)[0]):
+                self.record(line, path, "skipped", settings)
+                continue
+            job_options = {"settings": settings, "manifest": (self, line, key), "journal_id": None}
+            if prefetcher is not None and Path(path).suffix.lower() in prefetch_extensions:
+                job_options["prefetch"] = prefetcher.add(path)
+            transcription_queue.put((path, True, time.time(), job_options))
+            queued += 1
+        print(f"[Manifest] {queued} queued, {self.counts.get('skipped', 0)} already done, "
+              f"{self.counts.get('duplicate', 0)} duplicate(s), "
+              f"{self.counts.get('missing', 0) + self.counts.get('invalid', 0)} missing or invalid.")
+        return queued
+
+    def finish(self, manifest, path, state, settings, error=None, queue_wait=None, process=None, audio_seconds=None):
+        """Records the end of a manifest job; done entries go into the skip index."""
+        _, line, key = manifest
+        if state == "done":
+            self.index.add(key, path)
+        self.record(line, path, state, settings, error, queue_wait_s=queue_wait, process_s=process, audio_s=audio_seconds)
+
+    def close(self):
+        with self.lock:
+            self.results.close()
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(self.counts.items()))
+        print(f"[Manifest] Results written to {self.results_path} ({summary}).")
+
+
+# --- Recording Archive ---
+ARCHIVE_MUXERS = {"flac": "flac", "opus": "ogg"}
+
+
+class RecordingArchive:
+    """Compresses finished recordings out of base_dir and enforces the retention limits.
+
+    A recording is finished once it has a transcript, is older than min_age_minutes and is not
+    queued or running in the journal. It is re-encoded with ffmpeg into <directory>/<YYYY-MM>/
+    and the WAV is removed; transcripts stay where they are. The SQLite index keeps one row per
+    recording with its transcript text, so old recordings can still be found after their audio
+    has expired.
+    """
+
+    def __init__(self, directory, index_path, audio_format="flac", opus_bitrate="24k", min_age_minutes=30.0,
+                 keep_days=0.0, max_count=0, max_total_mb=0.0):
+        self.directory = directory
+        self.audio_format = audio_format
+        self.opus_bitrate = opus_bitrate
+        self.min_age = min_age_minutes * 60
+        self.keep_days = keep_days
+        self.max_count = max_count
+        self.max_total_bytes = max_total_mb * 1024 * 1024
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(index_path, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS recordings ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, recorded REAL NOT NULL, "
+                "duration REAL NOT NULL, wav_bytes INTEGER NOT NULL, path TEXT NOT NULL, bytes INTEGER NOT NULL, "
+                "state TEXT NOT NULL, transcript TEXT NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS recordings_recorded ON recordings (recorded)")
+
+    def candidates(self):
+        """Finished recordings in base_dir as (path, name, mtime), oldest first."""
+        with os.scandir(base_dir) as entries:
+            entries = list(entries)
+        done = transcribed_stems(entry.name for entry in entries)
+        pending = job_journal.pending_paths() if job_journal is not None else set()
+        cutoff = time.time() - self.min_age
+        found = []
+        for entry in entries:
+            stem, extension = os.path.splitext(entry.name)
+            # Only the app's own recordings ("<timestamp>-audio.wav" or "audio.wav"), never user files
+            if extension.lower() != ".wav" or not (stem == "audio" or stem.endswith("-audio")) or stem not in done:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            if mtime < cutoff and os.path.abspath(entry.path) not in pending:
+                found.append((entry.path, entry.name, mtime))
+        return sorted(found, key=lambda candidate: candidate[2])
+
+    def transcript_text(self, wav_path):
+        """Text of the recording's newest TXT transcript, or its SRT when there is no TXT."""
+        stem = os.path.splitext(wav_path)[0]
+        for extension in (".txt", ".srt"):
+            matches = [
+                os.path.join(base_dir, name) for name in os.listdir(base_dir)
+                if name.startswith(os.path.basename(stem) + ".") and name.lower().endswith(extension)
+            ]
+            if not matches:
+                continue
+            newest = max(matches, key=os.path.getmtime)
+            if extension == ".srt":
+                return " ".join(segment["text"] for segment in parse_srt(newest))
+            with open(newest, encoding="utf-8") as f:
+                return " ".join(f.read().split())
+        return ""
+
+    def encode(self, source, recorded):
+        """Re-encodes source into the month folder of its recording time; returns the archive path."""
+        month_dir = os.path.join(self.directory, datetime.fromtimestamp(recorded).strftime("%Y-%m"))
+        os.makedirs(month_dir, exist_ok=True)
+        target = f"{get_unique_output_base(os.path.join(month_dir, os.path.basename(source)), extensions=(self.audio_format,))}.{self.audio_format}"
+        codec = ["-c:a", "flac"] if self.audio_format == "flac" else ["-c:a", "libopus", "-b:a", self.opus_bitrate]
+        partial = f"{target}.partial"
+        # Below normal priority, so encoding never competes with transcription for the CPU
+        if os.name == "nt":
+            low_priority = {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+        else:
+            low_priority = {"preexec_fn": lambda: os.nice(10)}
+        try:
+            subprocess.run(
+                [ffmpeg_path, "-nostdin", "-v", "error", "-y", "-i", source, *codec,
+                 "-f", ARCHIVE_MUXERS[self.audio_format], partial],
+                check=True, capture_output=True, **low_priority,
+            )
+            os.replace(partial, target)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return target
+
+    def archive_pending(self):
+        """Archives the finished recordings while the app is idle; returns how many."""
+        archived = 0
+        for wav_path, name, recorded in self.candidates():
+            if controller.state != State.IDLE:
+                break  # A dictation goes first; the rest waits for the next pass
+            wav_bytes = os.path.getsize(wav_path)
+            duration = get_wav_duration(wav_path)
+            transcript = self.transcript_text(wav_path)
+            with metrics.stage("archive_encode"):
+                target = self.encode(wav_path, recorded)
+            try:
+                os.remove(wav_path)
+            except OSError as e:
+                os.remove(target)  # Still in use; archived on a later pass
+                print(f"[Archive] Cannot remove {wav_path} yet: {e}")
+                continue
+            size = os.path.getsize(target)
+            with self.lock, self.db:
+                self.db.execute(
+                    "INSERT INTO recordings (name, recorded, duration, wav_bytes, path, bytes, state, transcript) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'archived', ?)",
+                    (name, recorded, duration, wav_bytes, target, size, transcript),
+                )
+            print(f"[Archive] {name} -> {target} ({wav_bytes / 1024 / 1024:.1f} MB -> {size / 1024 / 1024:.1f} MB)")
+            archived += 1
+        return archived
+
+    def enforce_retention(self):
+        """Deletes the archived audio beyond keep_days, max_count or max_total_mb, oldest first."""
+        now = time.time()
+        kept_bytes = 0
+        expired = []
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, path, bytes, recorded FROM recordings WHERE state = 'archived' ORDER BY recorded DESC"
+            ).fetchall()
+        for position, (recording_id, path, size, recorded) in enumerate(rows):
+            if (
+                (self.keep_days and recorded < now - self.keep_days * 86400)
+                or (self.max_count and position >= self.max_count)
+                or (self.max_total_bytes and kept_bytes + size > self.max_total_bytes)
+            ):
+                expired.append((recording_id, path))
+            else:
+                kept_bytes += size
+        for recording_id, path in expired:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Archive] Cannot remove {path}: {e}")
+                continue
+            with self.lock, self.db:
+                self.db.execute("UPDATE recordings SET state = 'expired', bytes = 0 WHERE id = ?", (recording_id,))
+        return len(expired)
+
+    def find(self, query, limit=20):
+        """Recordings whose name or transcript contains query, newest first."""
+        pattern = f"%{query}%"
+        with self.lock:
+            return self.db.execute(
+                "SELECT name, recorded, duration, state, path, transcript FROM recordings "
+                "WHERE name LIKE ? OR transcript LIKE ? ORDER BY recorded DESC LIMIT ?",
+                (pattern, pattern, limit),
+            ).fetchall()
+
+    def summary(self):
+        """{state: (count, archived bytes, original WAV bytes)}."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT state, COUNT(*), SUM(bytes), SUM(wav_bytes) FROM recordings GROUP BY state"
+            ).fetchall()
+        return {state: (count, size or 0, wav_bytes or 0) for state, count, size, wav_bytes in rows}
+
+    def run(self, interval_seconds):
+        counts = self.summary()
+        archived_count, archived_bytes, _ = counts.get("archived", (0, 0, 0))
+        print(f"[Archive] {self.directory}: {archived_count} recording(s), {archived_bytes / 1024 / 1024:.1f} MB.")
+        while True:
+            try:
+                archived = self.archive_pending()
+                if archived:
+                    metrics.increment("archive_files", archived)
+                expired = self.enforce_retention()
+                if expired:
+                    print(f"[Archive] Retention removed the audio of {expired} recording(s).")
+            except Exception as e:
+                print(f"[Archive] Error: {e}")
+            time.sleep(interval_seconds)
+
+
+def print_recording_matches(query):
+    for name, recorded, duration, state, path, transcript in recording_archive.find(query):
+        when = datetime.fromtimestamp(recorded).strftime("%Y-%m-%d %H:%M")
+        audio = path if state == "archived" else "audio expired"
+        print(f"{when}  {name} ({duration:.0f}s, {audio})\n    {transcript[:160]}")
+
+
+# --- Metrics ---
+class StageHistogram:
+    """Latency histogram for one pipeline stage, with fixed millisecond buckets."""
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # Last bucket: above 60 s
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        milliseconds = seconds * 1000
+        index = 0
+        while index < len(self.BUCKETS_MS) and milliseconds > self.BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                bound = self.BUCKETS_MS[index] if index < len(self.BUCKETS_MS) else self.max * 1000
+                return min(bound, self.max * 1000)
+        return self.max * 1000
+
+    def to_dict(self):
+        buckets = {f"le_{bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total * 1000, 3),
+            "min_ms": round(self.min * 1000, 3) if self.min is not None else None,
+            "max_ms": round(self.max * 1000, 3) if self.max is not None else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """Stage timers, counters and the audio throughput window shared by all threads.
+
+    Timings are also added to the per-job dict bound to the current thread (see bind()),
+    so every job's JSON line shows where its time went.
+    """
+    THROUGHPUT_WINDOW = 60.0  # Seconds over which audio seconds/s is averaged
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.audio_window = deque()  # (finished_at, audio_seconds)
+        self.local = threading.local()
+
+    def bind(self, timings):
+        """Attributes stages measured on this thread to a job (None to unbind)."""
+        self.local.timings = timings
+
+    def observe(self, stage, seconds, timings=None):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = StageHistogram()
+            histogram.observe(seconds)
+        if timings is None:
+            timings = getattr(self.local, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name, timings=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, timings)
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_audio(self, seconds):
+        now = time.time()
+        with self.lock:
+            self.counters["audio_seconds_total"] = self.counters.get("audio_seconds_total", 0.0) + seconds
+            self.audio_window.append((now, seconds))
+
+    def audio_rate(self):
+        """Audio seconds transcribed per wall-clock second over the last THROUGHPUT_WINDOW."""
+        cutoff = time.time() - self.THROUGHPUT_WINDOW
+        with self.lock:
+            while self.audio_window and self.audio_window[0][0] < cutoff:
+                self.audio_window.popleft()
+            return sum(seconds for _, seconds in self.audio_window) / self.THROUGHPUT_WINDOW
+
+    def snapshot(self):
+        with self.lock:
+            stages = {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+            counters = dict(self.counters)
+        return {"counters": counters, "stages": stages}
+
+
+metrics = Metrics()
+metrics_file_lock = threading.Lock()
+
+
+def metrics_snapshot():
+    """Stage histograms and counters plus the live gauges."""
+    snapshot = metrics.snapshot()
+    snapshot.update({
+        "type": "snapshot",
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "queue_depth": transcription_queue.qsize(),
+        "jobs_in_flight": jobs_in_flight,
+        "artifact_queue_depth": artifact_queue.qsize(),
+        "audio_seconds_per_second": round(metrics.audio_rate(), 3),
+    })
+    return snapshot
+
+
+def append_metrics_line(record):
+    if not metrics_file:
+        return
+    with metrics_file_lock:
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        with open(metrics_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def record_job_metrics(job_id, audio_file_path, worker_name, job_options, audio_seconds, options, route=None):
+    """Counts the job and, with [metrics] enabled, writes its stage timings as a JSON line."""
+    metrics.increment("jobs_completed")
+    if not metrics_enabled:
+        return
+    metrics.add_audio(audio_seconds)
+    append_metrics_line({
+        "type": "job",
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "job_id": job_id,
+        "file": os.path.basename(audio_file_path),
+        "worker": worker_name,
+        "model": options.get("model"),
+        "threads": options.get("threads"),
+        "route": route,
+        "audio_seconds": round(audio_seconds, 3),
+        "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in job_options.get("timings", {}).items()},
+    })
+
+
+def run_metrics_snapshots():
+    """Appends a snapshot line every snapshot_seconds while there is activity."""
+    last_completed = None
+    while True:
+        time.sleep(metrics_snapshot_seconds)
+        snapshot = metrics_snapshot()
+        completed = snapshot["counters"].get("jobs_completed", 0)
+        if completed != last_completed or snapshot["queue_depth"] or snapshot["jobs_in_flight"]:
+            append_metrics_line(snapshot)
+            last_completed = completed
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics returns the current snapshot as JSON."""
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps(metrics_snapshot(), indent=2).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for transcription output
+
+
+def start_metrics_server(port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print(f"Metrics endpoint: http://127.0.0.1:{port}/metrics")
+    return server
 
 
-def get_unique_path(path, language=None):
-    """Adds .1, .2, etc. to the filename if it already exists. Handles optional language postfix."""
-    path = Path(path)
-    parent = path.parent
-    stem = path.stem
-    suffix = path.suffix
+def print_metrics_summary():
+    """Prints count, p50 and p95 per stage (used by --stats and the tray's Worker Status)."""
+    snapshot = metrics_snapshot()
+    if not snapshot["stages"]:
+        return
+    print("[Metrics] Stage latencies:")
+    for name, stage in snapshot["stages"].items():
+        print(f"  {name:<18} n={stage['count']:<5} p50={stage['p50_ms']:.0f}ms p95={stage['p95_ms']:.0f}ms max={stage['max_ms']:.0f}ms")
+    print(
+        f"[Metrics] Queue depth {snapshot['queue_depth']}, jobs in flight {snapshot['jobs_in_flight']}, "
+        f"{snapshot['audio_seconds_per_second']:.2f} audio s/s over the last minute."
+    )
 
-    if language:
-        # Initial target with language: filename.ru.srt
-        target_path = parent / f"{stem}.{language}{suffix}"
-    else:
-        target_path = path
 
-    if not target_path.exists():
-        return str(target_path)
+# --- Job API ---
+API_JOB_HISTORY = 1000  # Finished API jobs kept for status queries
+API_FINAL_STATES = ("done", "failed", "cancelled")
 
-    counter = 1
-    while True:
-        if language:
-            # If exists, becomes filename.1.ru.srt
-            new_name = f"{stem}.{counter}.{language}{suffix}"
-        else:
-            new_name = f"{stem}.{counter}{suffix}"
-            
-        new_path = parent / new_name
-        if not new_path.exists():
-            return str(new_path)
-        counter += 1
 
+class ApiJob:
+    """State and segments of a job submitted through the API, shared with the worker that runs it."""
 
-def get_files_from_clipboard():
-    """Extracts valid existing audio/video files from clipboard text."""
-    try:
-        text = pyperclip.paste()
-        if not text:
-            return []
+    def __init__(self, path, label=None):
+        self.id = None  # Queue job id, set once queued
+        self.path = path
+        self.label = label  # Client-supplied name of an upload; never used as a path
+        self.state = "queued"  # queued -> running -> done/failed/cancelled
+        self.segments = []
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self.children = []  # Job ids of long-file chunks, cancelled together with the job
+        self.changed = threading.Condition()
 
-        lines = text.splitlines()
-        found_files = []
-        for line in lines:
-            line = line.strip().strip('"')  # Remove quotes if copied from explorer
-            if not line:
-                continue
-            path = Path(line)
-            if path.exists() and path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                found_files.append(str(path))
-        return found_files
-    except Exception as e:
-        print(f"Error reading clipboard: {e}")
-        return []
+    def update(self, state=None, segments=None, error=None, replace=False):
+        """Applies a change and wakes event streams; a finished job doesn't change anymore."""
+        with self.changed:
+            if self.state in API_FINAL_STATES:
+                return
+            if segments is not None:
+                self.segments = list(segments) if replace else self.segments + list(segments)
+            if error is not None:
+                self.error = error
+            if state is not None:
+                self.state = state
+                if state in API_FINAL_STATES:
+                    self.finished = time.time()
+            self.changed.notify_all()
 
+    def to_dict(self, with_segments=True):
+        with self.changed:
+            job = {
+                "id": self.id, "path": self.path, "label": self.label, "state": self.state, "error": self.error,
+                "submitted": self.submitted, "finished": self.finished, "segment_count": len(self.segments),
+            }
+            if with_segments:
+                job["segments"] = list(self.segments)
+        return job
 
-def load_configuration(config_path):
-    if not config_path.exists():
-        print(f"Error: Configuration file not found at '{config_path}'.")
-        print("Please copy 'config.ini.template' to 'config.ini' and configure it.")
-        sys.exit(1)
 
-    config = configparser.ConfigParser()
-    config.read(config_path)
-    return config
+api_jobs = {}  # job id -> ApiJob
+api_jobs_lock = threading.Lock()
 
 
-config = load_configuration(CONFIG_FILE)
+def submit_api_job(path, job_options, skip_clipboard, priority, label=None):
+    """Queues a job for an API client and registers it for status queries."""
+    api_job = ApiJob(path, label)
+    job_options["api_job"] = api_job
+    with api_jobs_lock:
+        api_job.id = transcription_queue.put((path, skip_clipboard, time.time(), job_options), priority)
+        api_jobs[api_job.id] = api_job
+        finished = [job_id for job_id, job in api_jobs.items() if job.state in API_FINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - API_JOB_HISTORY)]:
+            del api_jobs[job_id]
+    if priority < PRIORITY_BATCH and preempt_batch:
+        preempt_batch_job()
+    return api_job
 
-# Configuration parameters from config file
-whisper_faster_path = config.get("paths", "whisper_faster_executable")
 
-base_dir_raw = config.get("paths", "base_directory")
-if os.path.isabs(base_dir_raw):
-    base_dir = base_dir_raw
-else:
-    base_dir = str(PROJECT_ROOT / base_dir_raw)
+def api_job_settings(params):
+    """Job settings from request parameters, defaulting to the current ones. Raises ValueError."""
+    settings = current_job_settings()
+    model = params.get("model")
+    if model is not None:
+        if model not in MODELS + [MODEL_AUTO]:
+            raise ValueError(f"Unknown model: {model}")
+        settings["model"] = model
+    if "language" in params:
+        language = params["language"] or None
+        if language is not None and language not in [code for code, _ in LANGUAGES]:
+            raise ValueError(f"Unknown language: {language}")
+        settings["language"] = language
+    if "one_mode" in params:
+        settings["one_mode"] = str(params["one_mode"]).lower() in ("1", "true", "yes")
+    settings["fragment_mode"] = False  # The clipboard, if used, gets plain lines
+    return settings
 
-model_path = config.get("paths", "model_directory")
-hotkey = config.get("settings", "hotkey")
-hotkey_fragment = config.get("settings", "hotkey_fragment", fallback="<ctrl>+<alt>+f")
 
-os.makedirs(base_dir, exist_ok=True)  # Create a directory if it does not already exist
+def cancel_api_job(api_job):
+    """Cancels an API job and any long-file chunks it was split into."""
+    found = cancel_job(api_job.id)
+    api_job.update(state="cancelled")
+    for chunk_id in list(api_job.children):
+        found = cancel_job(chunk_id) or found
+    return found
 
-# Global state management
-class State:
-    IDLE = "IDLE"
-    RECORDING = "RECORDING"
-    PROCESSING = "PROCESSING"
-    WAITING = "WAITING"
 
-current_state = State.IDLE
-audio_data = []
-recording_thread = None
-copy_to_clipboard = False
-fragment_mode = False
-default_fragment_mode = False  # New global for tray setting
-one_mode = False
-default_one_mode = False  # New global for tray setting
-file_scanner_enabled = False  # Toggle for clipboard processing
-use_timestamp = False
-model_selected = "base"
-language_selected = None
-beep_off = False
-timestamp_str = ""
-audio_file_path = ""
-output_srt_path = ""
-output_txt_path = ""
-icon = None
-last_click_time = 0
-show_stats = False # Flag for execution timing logging
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Local job API.
 
-# Queue to store audio files for transcription
-transcription_queue = Queue()
-icon_update_queue = Queue()
+    POST /jobs                 JSON {"path", "model", "language", "one_mode", "priority", "clipboard"}
+    POST /jobs?sample_rate=... raw int16 PCM body (Content-Type: application/octet-stream)
+    GET  /jobs                 all known jobs, without segments
+    GET  /jobs/<id>            one job with its segments
+    GET  /jobs/<id>/events     NDJSON: state changes and segments as they arrive, until the job ends
+    POST /jobs/<id>/priority   JSON {"priority": "interactive" | "batch"}, for a job that is still queued
+    DELETE /jobs/<id>          cancel
+    """
 
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-def set_state(new_state):
-    global current_state
-    current_state = new_state
-    
-    if new_state == State.IDLE:
-        update_icon_color("blue")
-    elif new_state == State.RECORDING:
-        update_icon_color("red")
-    elif new_state == State.PROCESSING:
-        update_icon_color("yellow")
-    elif new_state == State.WAITING:
-        update_icon_color("gray")
+    def _route(self):
+        """Returns (parts, query) after checking the token, or None after sending an error."""
+        if api_token and self.headers.get("Authorization", "") != f"Bearer {api_token}":
+            self._send_json(401, {"error": "Missing or wrong bearer token."})
+            return None
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if not parts or parts[0] != "jobs":
+            self._send_json(404, {"error": "Not found."})
+            return None
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
 
+    def _job(self, parts):
+        with api_jobs_lock:
+            api_job = api_jobs.get(int(parts[1])) if parts[1].isdigit() else None
+        if api_job is None:
+            self._send_json(404, {"error": f"Unknown job: {parts[1]}"})
+        return api_job
 
-def update_icon_color(color):
-    icon_update_queue.put(color)
+    def do_POST(self):
+        route = self._route()
+        if route is None:
+            return
+        parts, query = route
+        if len(parts) == 3 and parts[2] == "priority":
+            self._set_priority(parts, query)
+            return
+        if len(parts) != 1:
+            self._send_json(404, {"error": "Not found."})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        if length > api_max_upload_mb * 1024 * 1024:
+            self._send_json(413, {"error": f"Upload larger than {api_max_upload_mb:g} MB."})
+            return
+        body = self.rfile.read(length)
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/octet-stream"):
+                params = query
+                sample_rate = int(params.get("sample_rate", capture_sample_rate))
+                channels = int(params.get("channels", 1))
+                if sample_rate <= 0 or channels < 1:
+                    raise ValueError("sample_rate must be positive and channels at least 1.")
+                pcm = np.frombuffer(body, dtype=np.int16)
+                if channels > 1:
+                    pcm = pcm[:len(pcm) - len(pcm) % channels].reshape(-1, channels)
+                if not len(pcm):
+                    raise ValueError("Empty PCM upload.")
+                # Server-side name, unique per job; the client's name is only a label
+                job_id = transcription_queue.reserve_id()
+                path = get_unique_output_base(
+                    os.path.join(base_dir, f"{generate_timestamp()}-api-{job_id}.wav"), extensions=("wav",)
+                ) + ".wav"
+                job_options = {"pcm": pcm, "sample_rate": sample_rate, "job_id": job_id}
+            else:
+                params = dict(query, **json.loads(body or b"{}"))
+                path = params.get("path")
+                if not path or not os.path.isfile(path):
+                    raise ValueError(f"File not found: {path}")
+                path = os.path.abspath(path)
+                job_options = {}
+            job_options["settings"] = api_job_settings(params)
+            interactive = params.get("priority") == "interactive"
+            clipboard = str(params.get("clipboard", "")).lower() in ("1", "true", "yes")
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if "pcm" not in job_options and prefetcher is not None and Path(path).suffix.lower() in prefetch_extensions:
+            job_options["prefetch"] = prefetcher.add(path)
+        api_job = submit_api_job(
+            path, job_options, not clipboard, PRIORITY_INTERACTIVE if interactive else PRIORITY_BATCH,
+            params.get("name") if "pcm" in job_options else None,
+        )
+        print(f"[API] Job {api_job.id} queued: {path}")
+        self._send_json(201, api_job.to_dict(with_segments=False))
 
+    def _set_priority(self, parts, query):
+        api_job = self._job(parts)
+        if api_job is None:
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = dict(query, **json.loads(self.rfile.read(length) or b"{}"))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        priorities = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+        if params.get("priority") not in priorities:
+            self._send_json(400, {"error": "priority must be \"interactive\" or \"batch\"."})
+            return
+        if not reprioritize_job(api_job.id, priorities[params["priority"]], list(api_job.children)):
+            self._send_json(409, {"error": f"Job {api_job.id} is not queued anymore."})
+            return
+        self._send_json(200, api_job.to_dict(with_segments=False))
 
-def update_icon():
-    global icon
-    while True:
-        color = icon_update_queue.get()
-        if icon is not None:
-            img = Image.new("RGB", (16, 16), color)
-            icon.icon = img
-        icon_update_queue.task_done()
+    def do_GET(self):
+        route = self._route()
+        if route is None:
+            return
+        parts, _query = route
+        if len(parts) == 1:
+            with api_jobs_lock:
+                jobs = list(api_jobs.values())
+            self._send_json(200, {"jobs": [job.to_dict(with_segments=False) for job in jobs]})
+            return
+        api_job = self._job(parts)
+        if api_job is None:
+            return
+        if len(parts) == 2:
+            self._send_json(200, api_job.to_dict())
+        elif len(parts) == 3 and parts[2] == "events":
+            self._stream_events(api_job)
+        else:
+            self._send_json(404, {"error": "Not found."})
 
+    def _stream_events(self, api_job):
+        # HTTP/1.0 without Content-Length: the response ends when the connection is closed
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        sent_state = None
+        sent_segments = 0
+        while True:
+            with api_job.changed:
+                while api_job.state == sent_state and len(api_job.segments) == sent_segments:
+                    api_job.changed.wait()
+                state, segments, error = api_job.state, api_job.segments, api_job.error
+            if len(segments) < sent_segments:
+                sent_segments = 0  # Replaced by the stitched result: send it again, in order
+            lines = [{"event": "segment", **segment} for segment in segments[sent_segments:]]
+            sent_segments = len(segments)
+            if state != sent_state:
+                lines.append({"event": "state", "id": api_job.id, "state": state, "error": error})
+                sent_state = state
+            try:
+                self.wfile.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8"))
+                self.wfile.flush()
+            except OSError:
+                return  # Client went away
+            if state in API_FINAL_STATES:
+                return
 
-def record_audio(sample_rate=44100):
-    global audio_data, audio_file_path
-    stop_key = hotkey_fragment if fragment_mode else hotkey
-    print(f"\nRecording started... Press {stop_key} again to stop.")
-    
-    # State is already set to RECORDING by on_activate before this thread starts
-    audio_data.clear()
+    def do_DELETE(self):
+        route = self._route()
+        if route is None:
+            return
+        parts, _query = route
+        if len(parts) != 2:
+            self._send_json(404, {"error": "Not found."})
+            return
+        api_job = self._job(parts)
+        if api_job is None:
+            return
+        if api_job.state not in API_FINAL_STATES:
+            cancel_api_job(api_job)
+        self._send_json(200, api_job.to_dict(with_segments=False))
 
-    def callback(indata, frames, time, status):
-        audio_data.append(indata.copy())
+    def log_message(self, format, *args):
+        pass  # Keep the console for transcription output
 
-    try:
-        with sd.InputStream(
-            samplerate=sample_rate, channels=1, dtype="int16", callback=callback
-        ):
-            while current_state == State.RECORDING:
-                sd.sleep(100)
-        
-        if audio_data:
-            full_audio = np.concatenate(audio_data, axis=0)
-            write(audio_file_path, sample_rate, full_audio)
-            print(f"Recording saved to {audio_file_path}")
-            # Tuple: (path, skip_clipboard, queued_at)
-            transcription_queue.put((audio_file_path, False, time.time()))
-            
-            # After recording, check if we need to process
-            # If queue has items, we go to PROCESSING
-            set_state(State.PROCESSING)
-        else:
-            print("No audio data recorded.")
-            # If no audio, go back to IDLE
-            if transcription_queue.empty():
-                set_state(State.IDLE)
-            else:
-                 set_state(State.PROCESSING)
 
-    except Exception as e:
-        print(f"An error occurred during recording: {e}")
-        # Error recovery: check queue
-        if transcription_queue.empty():
-            set_state(State.IDLE)
+def start_api_server(port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), ApiRequestHandler)
+    server.daemon_threads = True  # Open event streams don't block shutdown
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print(f"Job API: http://127.0.0.1:{port}/jobs{' (token required)' if api_token else ''}")
+    return server
+
+
+# --- Result Cache ---
+class TranscriptionCache:
+    """Persistent cache of transcription segments in SQLite.
+
+    Keys hash the audio content together with model, language and splitting mode, so renamed
+    or copied files still hit. The total payload size is capped with LRU eviction.
+    """
+
+    def __init__(self, directory, max_size_mb):
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "cache.db"), check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, segments TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def content_hash(audio_file_path):
+        """Running SHA-256 over a file's bytes; key() finishes a copy of it per job."""
+        digest = hashlib.sha256()
+        with open(audio_file_path, "rb") as audio_file:
+            for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest
+
+    @staticmethod
+    def key(audio_file_path, pcm, options, content_hash=None, sample_rate=None):
+        """Content hash of the audio plus everything that changes the transcription.
+
+        content_hash is the file's content_hash() when the prefetcher already read it. Raw
+        pcm has no header, so its sample_rate and channel count are hashed with it.
+        """
+        if pcm is not None:
+            digest = hashlib.sha256(np.ascontiguousarray(pcm).tobytes())
+            digest.update(f"|{sample_rate}|{pcm.shape[1] if pcm.ndim > 1 else 1}".encode("utf-8"))
+        elif content_hash is not None:
+            digest = content_hash.copy()
         else:
-            set_state(State.PROCESSING)
+            digest = TranscriptionCache.content_hash(audio_file_path)
+        mode = "one_word" if options.get("one_mode") else "sentence"
+        digest.update(f"|{options['model']}|{options.get('language')}|{mode}".encode("utf-8"))
+        return digest.hexdigest()
 
+    def _count(self, name):
+        self.db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """Returns the cached segments or None, updating the hit/miss counters."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT segments FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            self.db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, key, segments):
+        payload = json.dumps(segments, ensure_ascii=False)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, segments, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count("evictions")
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        """Returns entries, total size in bytes and the hit/miss/eviction counters."""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = dict(self.db.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "entries": entries,
+            "size": size,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def purge(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("DELETE FROM counters")
+        with self.lock:
+            self.db.execute("VACUUM")
+
+
+EXECUTION_LOG = PROJECT_ROOT / "tmp" / "execution.tsv"
+EXECUTION_LOG_HEADER = "Timestamp\tFilename\tWait(s)\tProcess(s)\tModel\tLanguage\tAudio(s)\tRoute\tTrimmed(s)\tThreads\n"
+execution_log_lock = threading.Lock()
 
-def log_execution(audio_path, wait_time, process_time):
-    """Logs execution statistics to console and file if enabled."""
-    if not show_stats:
+
+def log_execution(audio_path, wait_time, process_time, worker_name=None, settings=None, audio_seconds=None,
+                  route=None, trimmed_seconds=0.0, threads=None):
+    """Logs execution statistics to console and file if enabled.
+
+    The file is also written while model routing is active, because the router learns from it.
+    """
+    routing_active = model_router is not None and model_selected == MODEL_AUTO
+    if not show_stats and not routing_active:
         return
 
     total_time = wait_time + process_time
     filename = os.path.basename(audio_path)
+    worker_info = f" | Worker: {worker_name}" if worker_name else ""
+    trimmed_info = f" | Trimmed: {trimmed_seconds:.2f}s" if trimmed_seconds else ""
+    threads_info = f" | Threads: {threads}" if threads else ""
     
     # Console output
-    print(f"[Stats] File: {filename} | Wait: {wait_time:.2f}s | Process: {process_time:.2f}s | Total: {total_time:.2f}s")
+    if show_stats:
+        print(f"[Stats] File: {filename} | Wait: {wait_time:.2f}s | Process: {process_time:.2f}s | Total: {total_time:.2f}s{trimmed_info}{threads_info}{worker_info}")
 
     # File output
-    log_file = PROJECT_ROOT / "tmp" / "execution.tsv"
+    log_file = EXECUTION_LOG
     # Ensure tmp directory exists (it should be created in run_transcription, but safety check)
     log_file.parent.mkdir(parents=True, exist_ok=True)
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp}\t{filename}\t{wait_time:.4f}\t{process_time:.4f}\t{model_selected}\t{language_selected}\n"
-    
-    # Check if we need to write headers (file doesn't exist or is empty)
-    write_header = not log_file.exists() or log_file.stat().st_size == 0
+    settings = settings or current_job_settings()
+    audio_column = f"{audio_seconds:.2f}" if audio_seconds is not None else ""
+    log_entry = (
+        f"{timestamp}\t{filename}\t{wait_time:.4f}\t{process_time:.4f}\t{settings['model']}\t{settings['language']}"
+        f"\t{audio_column}\t{route or ''}\t{trimmed_seconds:.2f}\t{threads or ''}\n"
+    )
     
     try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            if write_header:
-                 f.write("Timestamp\tFilename\tWait(s)\tProcess(s)\tModel\tLanguage\n")
-            f.write(log_entry)
+        with execution_log_lock:
+            rotate_execution_log(log_file)
+            # Check if we need to write headers (file doesn't exist or is empty)
+            write_header = not log_file.exists() or log_file.stat().st_size == 0
+            with open(log_file, "a", encoding="utf-8") as f:
+                if write_header:
+                    f.write(EXECUTION_LOG_HEADER)
+                f.write(log_entry)
     except Exception as e:
         print(f"Failed to write to log file: {e}")
 
 
-def run_transcription():
-    global model_selected, language_selected, beep_off
+def rotate_execution_log(log_file):
+    """Moves a log written with an older column layout aside, so every row matches the header."""
+    if not log_file.exists() or log_file.stat().st_size == 0:
+        return
+    with open(log_file, "r", encoding="utf-8") as f:
+        header = f.readline()
+    if header != EXECUTION_LOG_HEADER:
+        rotated = log_file.with_name(f"execution.{generate_timestamp()}.tsv")
+        os.replace(log_file, rotated)
+        print(f"[Stats] {log_file.name} used an older column layout; moved to {rotated.name}.")
+
+
+def job_audio_seconds(audio_file_path, pcm, sample_rate):
+    """Duration of a job's audio: PCM length, WAV header, or ffprobe for other media."""
+    if pcm is not None:
+        return len(pcm) / float(sample_rate or capture_sample_rate)
+    return get_media_duration(audio_file_path)
+
+
+# --- Model Routing ---
+# Fallback cost model per model: (startup seconds, processing seconds per audio second)
+DEFAULT_MODEL_COSTS = {
+    "base": (1.0, 0.05),
+    "medium": (3.0, 0.3),
+    "distil-large-v3": (4.0, 0.2),
+    "large-v3-turbo": (4.0, 0.15),
+}
+
+
+class ModelRouter:
+    """Chooses the model per job from its duration, mode, the queue depth and measured speed.
+
+    Each model's cost is startup + audio_seconds * rtf, fitted from execution.tsv (and every job
+    since) once min_samples rows exist; until then DEFAULT_MODEL_COSTS are used. The best model
+    in routing_models order whose estimate fits the job's latency budget wins.
+    """
+    HISTORY_SIZE = 200  # Most recent samples kept per model
+
+    def __init__(self, log_file=EXECUTION_LOG, min_samples=5):
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.samples = {model: deque(maxlen=self.HISTORY_SIZE) for model in MODELS}
+        self.costs = dict(DEFAULT_MODEL_COSTS)
+        self.fitted = set()
+        self._load_history(log_file)
+
+    def _load_history(self, log_file):
+        if not os.path.exists(log_file):
+            return
+        try:
+            with open(log_file, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f, delimiter="\t"):
+                    if row.get("Model") not in self.samples or not row.get("Audio(s)"):
+                        continue
+                    if not (row.get("Route") or "").startswith(("auto", "fixed")):
+                        continue  # Cache hits and long-file splits say nothing about model speed
+                    self.samples[row["Model"]].append((float(row["Audio(s)"]), float(row["Process(s)"])))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[Router] Could not read history from {log_file}: {e}")
+        for model in MODELS:
+            self._fit(model)
+
+    def _fit(self, model):
+        samples = self.samples[model]
+        if len(samples) < self.min_samples:
+            return
+        audio = np.array([sample[0] for sample in samples])
+        process = np.array([sample[1] for sample in samples])
+        if np.ptp(audio) > 1.0:
+            rtf, startup = np.polyfit(audio, process, 1)
+        else:
+            # All clips about the same length: keep the default startup, fit the rate only
+            startup = DEFAULT_MODEL_COSTS[model][0]
+            rtf = float(np.median((process - min(startup, process.min())) / np.maximum(audio, 0.1)))
+        self.costs[model] = (max(0.0, float(startup)), max(0.001, float(rtf)))
+        self.fitted.add(model)
+
+    def observe(self, model, audio_seconds, process_seconds):
+        if model not in self.samples or not audio_seconds:
+            return
+        with self.lock:
+            self.samples[model].append((audio_seconds, process_seconds))
+            self._fit(model)
+
+    def estimate(self, model, audio_seconds):
+        startup, rtf = self.costs[model]
+        return startup + audio_seconds * rtf
+
+    def choose(self, audio_seconds, settings, interactive, queue_depth):
+        """Returns (model, reason)."""
+        if settings.get("fragment_mode"):
+            mode, budget = "fragment", routing_fragment_budget
+        elif settings.get("one_mode"):
+            mode, budget = "one-word", routing_one_word_budget if interactive else audio_seconds * routing_batch_max_rtf
+        elif interactive:
+            mode, budget = "dictation", routing_dictation_budget
+        else:
+            mode, budget = "batch", audio_seconds * routing_batch_max_rtf
+        budget = max(budget, 0.5)
+        pressure = ""
+        if queue_depth >= routing_busy_queue_depth:
+            budget /= 2
+            pressure = f", {queue_depth} queued"
+        with self.lock:
+            estimates = {model: self.estimate(model, audio_seconds) for model in routing_models}
+        for model in routing_models:
+            if estimates[model] <= budget:
+                source = "measured" if model in self.fitted else "default"
+                return model, (
+                    f"auto: {mode} {audio_seconds:.1f}s{pressure}; est. {estimates[model]:.1f}s ({source}) "
+                    f"within {budget:.1f}s budget"
+                )
+        fastest = min(routing_models, key=estimates.get)
+        return fastest, (
+            f"auto: {mode} {audio_seconds:.1f}s{pressure}; no model within {budget:.1f}s budget, "
+            f"fastest est. {estimates[fastest]:.1f}s"
+        )
+
+
+def copy_transcription(spoken_lines, skip_clipboard, fragment=None):
+    """Copies the transcribed lines to the clipboard, applying Fragment Mode formatting.
+
+    fragment is the job's Fragment Mode; None uses the current mode.
+    """
+    if copy_to_clipboard and not skip_clipboard:
+        text_to_copy = "\n".join(spoken_lines)
+        if fragment_mode if fragment is None else fragment:
+            # Fragment mode: lowercase first char, remove trailing period
+            if text_to_copy:
+                # Lowercase first character
+                text_to_copy = text_to_copy[0].lower() + text_to_copy[1:]
+                # Remove trailing period (and possibly whitespace before it)
+                if text_to_copy.strip().endswith("."):
+                    text_to_copy = text_to_copy.strip()[:-1]
+
+        with metrics.stage("clipboard"):
+            pyperclip.copy(text_to_copy)
+        print("Transcription copied to clipboard.")
+    elif copy_to_clipboard and skip_clipboard:
+        print("Skipping clipboard copy (batch processing).")
+
+
+def job_interrupted(job_options):
+    """True when a job failed because it was deliberately preempted or cancelled."""
+    return job_options.get("preempted", False) or job_options.get("cancelled", False)
+
+
+def run_transcription(worker_name="worker-1", worker_engine=None):
+    """Pool worker: takes jobs from transcription_queue and runs them on its own engine."""
+    global jobs_in_flight
+    set_worker_status(worker_name, "idle")
     while True:
         queue_item = transcription_queue.get()
+        with worker_lock:
+            jobs_in_flight += 1
+        job_engine = worker_engine or engine
         start_time = time.time()
-        queued_at = start_time # Default fall back if no timestamp provided
-
-        # Handle various queue item formats for robustness
-        # Format: (audio_file_path, skip_clipboard, queued_at)
-        if isinstance(queue_item, tuple):
-            if len(queue_item) == 3:
-                audio_file_path, skip_clipboard, queued_at = queue_item
-            elif len(queue_item) == 2:
-                 audio_file_path, skip_clipboard = queue_item
-            else:
-                 # Unexpected tuple size, treat as just path if possible or error
-                 audio_file_path = str(queue_item[0])
-                 skip_clipboard = False
-        else:
-            audio_file_path, skip_clipboard = queue_item, False
+
+        # Items are normalized by JobQueue.put():
+        # (audio_file_path, skip_clipboard, queued_at, job_options)
+        audio_file_path, skip_clipboard, queued_at, job_options = queue_item
+        job_id = job_options.get("job_id")
+        settings = job_options["settings"]
+        with worker_lock:
+            running_jobs[job_id] = {
+                "worker": worker_name, "engine": job_engine, "options": job_options, "started": start_time,
+            }
         
         wait_duration = start_time - queued_at
+        metrics.bind(job_options.setdefault("timings", {}))
+        metrics.observe("queue_wait", wait_duration)
+        options = {}
+        stream = job_options.get("stream")  # StreamSession when this item is a streamed part
+        pcm = job_options.get("pcm")  # In-memory recording, no WAV on disk yet
+        prefetch_slot = job_options.get("prefetch")
+        api_job = job_options.get("api_job")  # ApiJob when submitted through the local API
+        journal_id = job_options.get("journal_id")  # Set when the job is journaled for resume
+        manifest = job_options.get("manifest")  # (ManifestRun, line, key) for manifest entries
+        prefetched = False
+        requeued = False
+        audio_seconds = None
+        route = "fixed"  # How the model was chosen, logged to execution.tsv
+        result_segments = None
+        job_error = None
 
         try:
-            # We are now strictly processing this item
-            if current_state != State.RECORDING:
-                set_state(State.PROCESSING)
+            wav_written = job_options.get("wav_written")  # A WAV-mode recording, queued before its WAV
+            if wav_written is not None and not wav_written.is_set():
+                with metrics.stage("wav_wait"):
+                    wav_written.wait()
+            if prefetch_slot is not None and pcm is None:
+                with metrics.stage("prefetch_wait"):
+                    pcm = prefetch_slot.claim()
+                if pcm is not None:
+                    prefetched = True
+                    job_options["sample_rate"] = PREFETCH_SAMPLE_RATE
+            # Only recordings held in memory need their WAV written: prefetched files exist, and
+            # VAD jobs carry the untrimmed recording in wav_pcm (None once saved in WAV mode)
+            recording_pcm = None if prefetched else job_options.get("wav_pcm", pcm)
+            on_disk = pcm is not None and recording_pcm is None  # Transcripts always get written
+            time_map = job_options.get("time_map")  # Set when VAD compacted the audio
 
-            # Use a temporary directory for initial output to handle unique naming
-            temp_output_dir = str(PROJECT_ROOT / "tmp")
-            os.makedirs(temp_output_dir, exist_ok=True)
+            if settings["model"] == MODEL_AUTO or show_stats or metrics_enabled or manifest is not None:
+                audio_seconds = job_audio_seconds(audio_file_path, pcm, job_options.get("sample_rate"))
+            if settings["model"] == MODEL_AUTO:
+                interactive = job_options.get("priority", PRIORITY_BATCH) < PRIORITY_BATCH
+                if model_router is not None:
+                    model, route = model_router.choose(audio_seconds, settings, interactive, transcription_queue.qsize())
+                else:
+                    model, route = routing_models[0], "auto: no router, first configured model"
+                # Requeued jobs and long-file chunks reuse the resolved model
+                settings = job_options["settings"] = dict(settings, model=model)
+                print(f"[Router] {os.path.basename(audio_file_path)} -> {model} ({route})")
 
-            # Expected name from whisper-faster (based on input filename)
-            input_basename = os.path.basename(os.path.splitext(audio_file_path)[0])
-            temp_srt_path = os.path.join(temp_output_dir, f"{input_basename}.srt")
+            # We are now strictly processing this item
+            controller.transition(State.PROCESSING, unless=(State.RECORDING, State.WAITING))
 
-            # Final output paths - use get_unique_path to handle existing files and language postfix
-            final_srt_base = os.path.splitext(audio_file_path)[0] + ".srt"
-            final_srt_path = get_unique_path(final_srt_base, language_selected)
-            final_txt_path = os.path.splitext(final_srt_path)[0] + ".txt"
+            # Use a per-worker temporary directory for initial output to handle unique naming
+            temp_output_dir = str(PROJECT_ROOT / "tmp" / worker_name)
+            os.makedirs(temp_output_dir, exist_ok=True)
 
-            print(f"Starting transcription for {audio_file_path}...")
+            threads = threads_for_job(settings["model"], stable=job_engine.keeps_models)
+            set_worker_status(worker_name, f"{os.path.basename(audio_file_path)} ({threads} threads)")
+            print(f"[{worker_name}] Starting transcription for {audio_file_path} ({threads} threads)...")
+            if api_job is not None:
+                api_job.update(state="running")
+            if journal_id is not None and job_journal is not None:
+                job_journal.start(journal_id)
 
             spoken_lines = []
+            part_segments = []
 
             try:
-                # model_path is now loaded from config
-                srt_command = [
-                    whisper_faster_path,
-                    audio_file_path,
-                    "--task",
-                    "transcribe",
-                    "--model",
-                    model_selected,
-                    "--model_dir",
-                    model_path,
-                    "--output_dir",
-                    temp_output_dir,
-                    "--output_format",
-                    "srt",
-                    "--threads",
-                    "8"
-                ]
+                options = {
+                    "model": settings["model"],
+                    "language": settings["language"],
+                    "one_mode": settings["one_mode"],
+                    "beep_off": settings["beep_off"],
+                    "threads": threads,
+                }
+                # Streamed parts are unique by nature and are never cached
+                cache_key = None
+                cached_segments = None
+                if transcription_cache is not None and stream is None:
+                    with metrics.stage("cache_lookup"):
+                        content_hash = prefetch_slot.content_hash if prefetch_slot is not None else None
+                        cache_key = transcription_cache.key(
+                            audio_file_path, recording_pcm, options, content_hash, job_options.get("sample_rate")
+                        )
+                        cached_segments = transcription_cache.get(cache_key)
 
-                # ONE-WORD MODE vs SENTENCE SPLITTING
-                if one_mode:
-                     srt_command.extend(["--one_word", "2"])
+                if cached_segments is not None:
+                    route = "cache hit"
+                    result_segments = cached_segments
+                    print(f"[Cache] Hit for {audio_file_path}, skipping transcription.")
+                    # A re-run keeps the transcripts it already wrote instead of adding .1, .2 copies
+                    settings = dict(settings, reuse_identical=True)
+                    if pcm is not None:
+                        finish_transcription(
+                            audio_file_path, cached_segments, skip_clipboard, recording_pcm,
+                            job_options["sample_rate"], persist=True if on_disk else None, settings=settings,
+                            background=api_job is None,
+                        )
+                    else:
+                        with metrics.stage("output_write"):
+                            spoken_lines = write_transcripts(cached_segments, audio_file_path, settings)
+                        copy_transcription(spoken_lines, skip_clipboard, settings["fragment_mode"])
+                elif (
+                    long_files_enabled
+                    and stream is None
+                    and (pcm is None or prefetched)
+                    and (len(pcm) / PREFETCH_SAMPLE_RATE if prefetched else get_media_duration(audio_file_path)) >= long_min_duration
+                ):
+                    # Long media: chunks are queued for the whole pool, this job only splits
+                    route = "long file split"
+                    queue_long_file_chunks(
+                        audio_file_path, skip_clipboard, job_options, cache_key, audio=pcm if prefetched else None
+                    )
+                elif pcm is not None:
+                    # In-memory hand-off: segments come back as data, artifacts are written later
+                    with metrics.stage("engine"):
+                        segments = job_engine.transcribe_pcm(pcm, job_options["sample_rate"], options)
+                    if time_map is not None:
+                        segments = time_map.remap(segments)  # Back onto the original recording's timeline
+                    if stream is not None:
+                        part_segments = segments
+                    else:
+                        result_segments = segments
+                        if cache_key is not None:
+                            transcription_cache.put(cache_key, segments)
+                        finish_transcription(
+                            audio_file_path, segments, skip_clipboard, recording_pcm,
+                            job_options["sample_rate"], persist=True if on_disk else None, settings=settings,
+                            background=api_job is None,
+                        )
                 else:
-                     srt_command.append("--sentence")
+                    # Segments are produced once; every output format is written from them
+                    with metrics.stage("engine"):
+                        segments = job_engine.transcribe_segments(audio_file_path, temp_output_dir, options)
 
-                if language_selected is not None:
-                    srt_command.extend(["--language", language_selected])
-                if beep_off:
-                    srt_command.append("--beep_off")
-
-                print(
-                    f"\nFull command to execute transcription: \n{' '.join(srt_command)}\n"
-                )
-                subprocess.run(srt_command, check=True, capture_output=True, text=True)
-
-                if os.path.exists(temp_srt_path):
-                    # Move result to the final location with unique name
-                    shutil.move(temp_srt_path, final_srt_path)
-                    print(f"SRT transcription completed: {final_srt_path}")
-
-                    with open(final_srt_path, "r", encoding="utf-8") as srt_file:
-                        for line in srt_file:
-                            if (
-                                "-->" not in line
-                                and line.strip() != ""
-                                and not line.strip().isdigit()
-                            ):
-                                spoken_lines.append(line.strip())
-                    with open(final_txt_path, "w", encoding="utf-8") as txt_file:
-                        txt_file.write("\n".join(spoken_lines))
-                    print(f"TXT transcription created: {final_txt_path}")
-
-                    if copy_to_clipboard and not skip_clipboard:
-                        text_to_copy = "\n".join(spoken_lines)
-                        if fragment_mode:
-                            # Fragment mode: lowercase first char, remove trailing period
-                            if text_to_copy:
-                                # Lowercase first character
-                                text_to_copy = text_to_copy[0].lower() + text_to_copy[1:]
-                                # Remove trailing period (and possibly whitespace before it)
-                                if text_to_copy.strip().endswith("."):
-                                    text_to_copy = text_to_copy.strip()[:-1]
-
-                        pyperclip.copy(text_to_copy)
-                        print("Transcription copied to clipboard.")
-                    elif copy_to_clipboard and skip_clipboard:
-                        print("Skipping clipboard copy (batch processing).")
-                else:
-                    print(f"Error: Transcription output {temp_srt_path} was not created.")
+                    if stream is not None:
+                        # Partial result, stitched by the session once the recording is complete
+                        part_segments = segments
+                    else:
+                        result_segments = segments
+                        if cache_key is not None:
+                            transcription_cache.put(cache_key, segments)
+                        if prefetcher is not None:
+                            # Pipelined batch mode: output writing happens off the engine's critical path
+                            finish_transcription(audio_file_path, segments, skip_clipboard, persist=True,
+                                                 settings=settings, background=api_job is None)
+                        else:
+                            with metrics.stage("output_write"):
+                                spoken_lines = write_transcripts(segments, audio_file_path, settings)
+                            copy_transcription(spoken_lines, skip_clipboard, settings["fragment_mode"])
 
             except subprocess.CalledProcessError as e:
-                print(f"Transcription error: {e.stderr}")
+                job_error = (e.stderr or str(e)).strip()
+                if not job_interrupted(job_options):
+                    print(f"Transcription error: {e.stderr}")
+                    metrics.increment("jobs_failed")
             except Exception as e:
-                print(f"Error: {e}")
+                job_error = str(e)
+                if not job_interrupted(job_options):
+                    print(f"Error: {e}")
+                    metrics.increment("jobs_failed")
             finally:
-                transcription_queue.task_done()
-
-                # After task is done, check if more work exists
-                if transcription_queue.empty():
-                    # Only switch to IDLE if we aren't currently recording new audio
-                    if current_state != State.RECORDING:
-                        set_state(State.IDLE)
+                metrics.bind(None)
+                interrupted = job_interrupted(job_options)
+                with worker_lock:
+                    running_jobs.pop(job_id, None)
+                if job_options.pop("preempted", False):
+                    # Requeue before task_done() so join() never sees an empty queue in between
+                    print(f"[{worker_name}] Job {job_id} preempted by live dictation; requeued.")
+                    transcription_queue.put(queue_item, job_options["priority"])
+                    requeued = True
+                if job_options.get("cancelled"):
+                    print(f"[{worker_name}] Job {job_id} cancelled.")
+                if requeued:
+                    final_state = "queued"
+                elif job_options.get("cancelled"):
+                    final_state = "cancelled"
+                elif job_error is not None:
+                    final_state = "failed"
+                elif route != "long file split":
+                    final_state = "done"
                 else:
-                    if current_state != State.RECORDING:
-                        set_state(State.PROCESSING)
+                    final_state = None  # A split job finishes when its chunks are stitched
+                if stream is not None and not requeued:
+                    stream.complete_part(job_options["part"], part_segments, final_state, job_error)
+                if api_job is not None and final_state is not None:
+                    api_job.update(state=final_state, segments=(result_segments or []) if final_state == "done" else None,
+                                   error=job_error)
+                if journal_id is not None and job_journal is not None and final_state == "queued":
+                    job_journal.requeue(journal_id)
+                elif journal_id is not None and job_journal is not None and final_state is not None:
+                    job_journal.finish(journal_id, final_state, job_error)
+                if manifest is not None and final_state not in (None, "queued"):
+                    manifest[0].finish(
+                        manifest, audio_file_path, final_state, settings, job_error, wait_duration,
+                        time.time() - start_time, audio_seconds,
+                    )
+                if prefetch_slot is not None and not requeued:
+                    prefetcher.release(prefetch_slot)
 
-            # Log execution stats
+            # Log execution stats before task_done(), so a batch run can't exit before its last row is written
             process_end_time = time.time()
             process_duration = process_end_time - start_time
-            log_execution(audio_file_path, wait_duration, process_duration)
+            if not interrupted:
+                trimmed_seconds = job_options.get("trimmed", 0.0)
+                if trimmed_seconds:
+                    metrics.increment("vad_trimmed_seconds_total", trimmed_seconds)
+                log_execution(
+                    audio_file_path, wait_duration, process_duration, worker_name, settings, audio_seconds, route,
+                    trimmed_seconds, options.get("threads"),
+                )
+                if model_router is not None and "engine" in job_options["timings"]:
+                    model_router.observe(settings["model"], audio_seconds, process_duration)
+                record_job_metrics(job_id, audio_file_path, worker_name, job_options, audio_seconds, options, route)
+            set_worker_status(worker_name, "idle")
+            job_finished()
+            transcription_queue.task_done()
 
         except Exception as e:
+            metrics.bind(None)
             print(f"Error processing {audio_file_path}: {e}")
+            if api_job is not None:
+                api_job.update(state="failed", error=str(e))
+            if journal_id is not None and job_journal is not None:
+                job_journal.finish(journal_id, "failed", str(e))
+            if manifest is not None:
+                manifest[0].finish(manifest, audio_file_path, "failed", settings, str(e))
+            set_worker_status(worker_name, "idle")
+            job_finished()
             transcription_queue.task_done()
-            if transcription_queue.empty() and current_state != State.RECORDING:
-                set_state(State.IDLE)
 
 
 def generate_timestamp():
@@ -392,17 +4221,19 @@ def generate_timestamp():
 def on_activate():
     global recording_thread, timestamp_str, audio_file_path, output_srt_path, output_txt_path, fragment_mode
     
+    state = controller.state
+
     # Block new actions if waiting for console input (Always)
-    if current_state == State.WAITING:
+    if state == State.WAITING:
         print("Application is waiting for console input. Ignoring trigger.")
         return
     
     # In File Processing Mode, block while PROCESSING to ensure strictly sequential batch handling
-    if file_scanner_enabled and current_state == State.PROCESSING:
+    if file_scanner_enabled and state == State.PROCESSING:
         print("Application is busy processing files. Ignoring trigger.")
         return
 
-    if current_state != State.RECORDING:
+    if state != State.RECORDING:
         # Check for files in clipboard if scanner mode is active
         if file_scanner_enabled:
             found_files = get_files_from_clipboard()
@@ -412,28 +4243,31 @@ def on_activate():
                     print(f"  - {f}")
 
                 # Console confirmation
-                set_state(State.WAITING)
+                if not controller.transition(State.WAITING, unless=(State.RECORDING, State.WAITING)):
+                    return  # Another trigger got there first
                 confirm = input("Process these files? (y/n, default 'y'): ").lower().strip()
                 if confirm in ('', 'y', 'yes'):
                     print("Adding files to transcription queue...")
                     # If more than 1 file, we set skip_clipboard to True
                     skip_cb = len(found_files) > 1
                     for f in found_files:
-                        transcription_queue.put((f, skip_cb, time.time()))
+                        queue_batch_file(f, skip_cb)
                     
-                    # Ensure we are in PROCESSING state if we have items
-                    if not transcription_queue.empty():
-                        set_state(State.PROCESSING)
+                    controller.transition(State.IDLE, expect=(State.WAITING,))
+                    settle_state()  # PROCESSING while the files are queued
                     return # Skip microphone recording
                 else:
-                    print("File processing cancelled. Returning to IDLE.")
-                    set_state(State.IDLE)
+                    print("File processing cancelled.")
+                    controller.transition(State.IDLE, expect=(State.WAITING,))
+                    settle_state()
                     return 
             else:
                 print("[Scanner] No supported files found in clipboard. Microphone recording is disabled in File Processing Mode.")
                 return
 
-        set_state(State.RECORDING)
+        # Hotkey and tray can fire at the same time: only one of them starts the recording
+        if not controller.transition(State.RECORDING, unless=(State.RECORDING, State.WAITING)):
+            return
 
         if use_timestamp:
             timestamp_str = generate_timestamp()
@@ -448,58 +4282,76 @@ def on_activate():
         output_txt_path = os.path.join(
             base_dir, f"{timestamp_str}-audio.txt" if timestamp_str else "audio.txt"
         )
-        recording_thread = threading.Thread(target=record_audio)
+        recording_thread = threading.Thread(
+            target=record_audio, kwargs={"recording_path": audio_file_path, "settings": current_job_settings()}
+        )
         recording_thread.start()
-    else:
-        # Signal recording loop to stop by transitioning state
-        set_state(State.PROCESSING)
+    elif controller.transition(State.PROCESSING, expect=(State.RECORDING,)):
+        # The recorder wakes on this transition and queues the recording
         print("Stopping recording...")
 
 
-def restart_with_language(language):
-    global icon
-    if current_state != State.IDLE:
-        print(f"Application is busy ({current_state}). Please wait until IDLE to switch languages, or use 'Restart' to reset.")
+def set_language(language):
+    """Switches the language live; running recordings and queued jobs keep the language they started with."""
+    global language_selected
+    language_selected = language
+    print(f"\nLanguage set to {language or 'auto-detect'} (applies to recordings and files from now on).")
+    if icon:
+        icon.update_menu()
+
+
+def set_model(model):
+    """Switches the model live and optionally pre-warms it on the engines in the background."""
+    global model_selected, model_router
+    if model == model_selected:
         return
-    icon.stop()
-    python = sys.executable
-    script_to_run = __file__
-    args = [arg for arg in sys.argv[1:] if not arg.startswith("--language=")] + [f"--language={language}"]
-    
-    # Persist fragment mode setting
-    if default_fragment_mode:
-         if "--fragment" not in args:
-            args.append("--fragment")
-    else:
-        if "--fragment" in args:
-            args.remove("--fragment")
+    model_selected = model
+    print(f"\nModel set to {model} (applies to recordings and files from now on).")
+    if model == MODEL_AUTO:
+        if model_router is None:
+            model_router = ModelRouter(min_samples=routing_min_samples)
+    elif prewarm_on_switch:
+        threading.Thread(target=prewarm_model, args=(model,), daemon=True).start()
+    if icon:
+        icon.update_menu()
 
-    # Persist file scanner setting
-    if file_scanner_enabled:
-        if "--file-scanner" not in args:
-            args.append("--file-scanner")
-    else:
-        if "--file-scanner" in args:
-            args.remove("--file-scanner")
 
-    # Persist one-word mode setting
-    if default_one_mode:
-        if "--one-mode" not in args:
-            args.append("--one-mode")
-    else:
-        if "--one-mode" in args:
-            args.remove("--one-mode")
+def prewarm_model(model):
+    """Loads model on every engine that keeps models resident, so the next job doesn't wait for it."""
+    for worker_engine in engines:
+        try:
+            if worker_engine.prewarm(model, threads_for_job(model, stable=True)):
+                print(f"[Engine] Model {model} pre-warmed on the {worker_engine.name} engine.")
+        except EngineError as e:
+            print(f"[Engine] Could not pre-warm {model}: {e}")
 
-    print(f"\nRestarting with language: {language}\n")
 
-    subprocess.Popen([python, "restart.py", script_to_run] + args)
-    os._exit(0)
+def cycle_language():
+    codes = [None] + [code for code, _ in LANGUAGES]
+    set_language(codes[(codes.index(language_selected) + 1) % len(codes)] if language_selected in codes else codes[0])
+
+
+def cycle_model():
+    models = MODELS + [MODEL_AUTO]
+    set_model(models[(models.index(model_selected) + 1) % len(models)] if model_selected in models else models[0])
+
+
+def language_menu_item(code, label):
+    return pystray.MenuItem(
+        label, lambda: set_language(code), checked=lambda item: language_selected == code, radio=True
+    )
+
+
+def model_menu_item(model):
+    return pystray.MenuItem(
+        model, lambda: set_model(model), checked=lambda item: model_selected == model, radio=True
+    )
 
 
 def create_icon():
     global icon
-    # Initial icon is blue (IDLE) - handled by default in main/set_state or here
-    image = Image.new("RGB", (16, 16), color="blue")
+    # Start with the color of the current state; later changes come from the icon subscriber
+    image = icon_image(STATE_COLORS[controller.state])
     icon = pystray.Icon(
         "Whisper",
         image,
@@ -522,16 +4374,25 @@ def create_icon():
                 toggle_file_scanner,
                 checked=lambda item: file_scanner_enabled
             ),
+            pystray.MenuItem("Worker Status", print_worker_status),
+            pystray.MenuItem("Cancel Queued Batch Jobs", cancel_batch_jobs),
+            pystray.MenuItem(
+                "Beep Off",
+                toggle_beep,
+                checked=lambda item: beep_off
+            ),
             pystray.MenuItem("Restart", restart),
             pystray.MenuItem(
                 "Set Language",
                 pystray.Menu(
-                    pystray.MenuItem("English", lambda: restart_with_language("en")),
-                    pystray.MenuItem("Deutsch", lambda: restart_with_language("de")),
-                    pystray.MenuItem("Russian", lambda: restart_with_language("ru")),
-                    pystray.MenuItem("Ukrainian", lambda: restart_with_language("uk")),
+                    language_menu_item(None, "Auto-detect"),
+                    *[language_menu_item(code, label) for code, label in LANGUAGES],
                 ),
             ),
+            pystray.MenuItem(
+                "Set Model",
+                pystray.Menu(*[model_menu_item(model) for model in MODELS + [MODEL_AUTO]]),
+            ),
             pystray.MenuItem("Exit", lambda: exit_app()),
         ),
     )
@@ -539,7 +4400,7 @@ def create_icon():
 
 def on_activate_primary():
     global fragment_mode, one_mode
-    if current_state != State.RECORDING:
+    if controller.state != State.RECORDING:
         fragment_mode = default_fragment_mode
         one_mode = default_one_mode
         mode_name = "FRAGMENT" if fragment_mode else "ONE-WORD" if one_mode else "NORMAL"
@@ -558,9 +4419,13 @@ def toggle_file_scanner(icon, item):
     global file_scanner_enabled
     file_scanner_enabled = not file_scanner_enabled
 
+def toggle_beep(icon, item):
+    global beep_off
+    beep_off = not beep_off
+
 def on_activate_fragment():
     global fragment_mode, one_mode
-    if current_state != State.RECORDING:
+    if controller.state != State.RECORDING:
         fragment_mode = True
         one_mode = False
         print("Starting FRAGMENT recording...")
@@ -594,18 +4459,20 @@ def restart():
 def exit_app():
     """Function to handle cleanup and exit the application."""
     global recording_thread, transcription_queue, icon_update_queue
-    if current_state == State.RECORDING:
-        set_state(State.IDLE) # Break the loop
-        recording_thread.join()
+    if controller.transition(State.PROCESSING, expect=(State.RECORDING,)):
+        recording_thread.join()  # The recording is queued and transcribed before exiting
     transcription_queue.join()
+    artifact_queue.join()
     icon_update_queue.join()
+    for worker_engine in engines:
+        worker_engine.close()
     if icon:
         icon.stop()
     os._exit(0)
 
 
 def main():
-    global copy_to_clipboard, use_timestamp, model_selected, language_selected, beep_off, tray
+    global copy_to_clipboard, use_timestamp, model_selected, language_selected, beep_off, tray, engine
     parser = argparse.ArgumentParser(
         description="Audio recorder and transcriber with Whisper."
     )
@@ -617,13 +4484,14 @@ def main():
     )
     parser.add_argument(
         "--model",  # Fixed typo from "modeel"
-        choices=["base", "medium", "distil-large-v3", "large-v3-turbo"],  # Added "turbo" option
+        choices=MODELS + [MODEL_AUTO],
         default="base",
-        help="Select Whisper model version (base, medium, or distil-large-v3, large-v3-turbo).",  # Updated help text
+        help="Select Whisper model version (base, medium, distil-large-v3, large-v3-turbo), "
+             "or auto to choose one per job.",
     )
     parser.add_argument(
         "--language",
-        choices=["en", "de", "ru", "uk"],
+        choices=[code for code, _ in LANGUAGES],
         default=None,
         help="Select language for transcription.",
     )
@@ -639,16 +4507,108 @@ def main():
     parser.add_argument(
         "--stats", action="store_true", help="Enable execution timing logging to console and file."
     )
+    parser.add_argument(
+        "--stream", action="store_true", help="Transcribe recordings in segments while still recording."
+    )
+    parser.add_argument(
+        "--warm", action="store_true",
+        help="Keep the microphone stream open between recordings and prepend a pre-roll.",
+    )
+    parser.add_argument(
+        "--spill", action="store_true",
+        help="Stream recordings into their WAV file while recording, with bounded memory.",
+    )
+    parser.add_argument(
+        "--in-memory", action="store_true", help="Hand recordings to the engine as PCM instead of a WAV file."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of concurrent transcription jobs."
+    )
+    parser.add_argument(
+        "--long-files", action="store_true",
+        help="Split long media files at silences and transcribe the chunks in parallel.",
+    )
+    parser.add_argument(
+        "--prefetch", action="store_true",
+        help="Decode upcoming batch files to PCM while the current one is transcribed.",
+    )
+    parser.add_argument(
+        "--vad", action="store_true",
+        help="Trim silence at the edges and shorten long pauses before transcription.",
+    )
+    parser.add_argument(
+        "--watch", action="append", default=None, metavar="DIR",
+        help="Watch a directory and queue new media files (repeatable; adds to [watch] directories).",
+    )
+    parser.add_argument(
+        "--api", action="store_true",
+        help="Serve the local job API (see [api] in config.ini).",
+    )
+    parser.add_argument(
+        "--metrics", action="store_true",
+        help="Record per-stage latency metrics (see [metrics] in config.ini).",
+    )
+    parser.add_argument(
+        "--formats", default=None,
+        help="Comma-separated transcript formats to write: srt, txt, vtt, json (overrides [output] formats).",
+    )
+    parser.add_argument(
+        "--autotune", action="store_true",
+        help="Measure each installed model at several thread counts, store this host's profile and exit.",
+    )
+    parser.add_argument(
+        "--manifest", default=None, metavar="FILE",
+        help="Transcribe the entries of a JSONL or CSV manifest, skipping those already done.",
+    )
+    parser.add_argument(
+        "--results", default=None, metavar="FILE",
+        help="Results manifest to write (default: <manifest>.results.jsonl).",
+    )
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="Run without audio devices, hotkeys, tray or clipboard: process files, watch folders and API jobs.",
+    )
+    parser.add_argument(
+        "--archive", action="store_true", help="Compress finished recordings in the background and apply retention."
+    )
+    parser.add_argument(
+        "--find-recording", default=None, metavar="TEXT",
+        help="List archived recordings whose name or transcript contains TEXT and exit.",
+    )
+    parser.add_argument(
+        "--journal", action="store_true", help="Show the job journal (counts, failed jobs and reasons) and exit."
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="Queue the journal's failed jobs again at startup."
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Bypass the transcription result cache."
+    )
+    parser.add_argument(
+        "--purge-cache", action="store_true", help="Delete all cached transcriptions and exit."
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINE_BACKENDS,
+        default=None,
+        help="Transcription backend (overrides [engine] backend in config.ini).",
+    )
     parser.add_argument(
         "files", nargs="*", help="Optional list of file paths to transcribe immediately."
     )
     args = parser.parse_args()
-    copy_to_clipboard = args.clipboard
+    if not CONFIG_FILE.exists():
+        if not args.headless:
+            print(f"Error: Configuration file not found at '{CONFIG_FILE}'.")
+            print("Please copy 'config.ini.template' to 'config.ini' and configure it.")
+            sys.exit(1)
+        print(f"No configuration file at '{CONFIG_FILE}'; using the defaults.")
+    copy_to_clipboard = args.clipboard and not args.headless
     use_timestamp = args.timestamp
     model_selected = args.model
     language_selected = args.language
     beep_off = args.beep_off
-    tray = args.tray
+    tray = args.tray and not args.headless
 
     # Set initial state from CLI arg
     global default_fragment_mode, default_one_mode, file_scanner_enabled, show_stats
@@ -657,12 +4617,166 @@ def main():
     file_scanner_enabled = args.file_scanner
     show_stats = args.stats
 
-    print("Available audio devices:")
-    print(sd.query_devices())
+    global streaming_enabled, in_memory_handoff, long_files_enabled, prefetch_enabled, metrics_enabled, vad_enabled
+    vad_enabled = vad_enabled or args.vad
+    metrics_enabled = metrics_enabled or args.metrics
+    long_files_enabled = long_files_enabled or args.long_files
+    prefetch_enabled = prefetch_enabled or args.prefetch
+    streaming_enabled = streaming_enabled or args.stream
+    in_memory_handoff = in_memory_handoff or args.in_memory
+    global spill_enabled
+    spill_enabled = spill_enabled or args.spill
+
+    # Warm capture: open the microphone once, recordings then start without device latency
+    global warm_capture
+    if (warm_capture_enabled or args.warm) and not args.headless:
+        warm_capture = WarmCapture(capture_sample_rate, capture_preroll_seconds)
+        try:
+            warm_capture.open()
+            print(f"Warm capture: input stream open, {capture_preroll_seconds:g}s pre-roll.")
+        except Exception as e:
+            print(f"Warning: Could not open the input stream for warm capture ({e}); opening it per recording.")
+            warm_capture = None
+
+    global output_formats
+    if args.formats:
+        output_formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown_formats = [fmt for fmt in output_formats if fmt not in TRANSCRIPT_WRITERS]
+    if unknown_formats:
+        print(f"Warning: Unknown transcript format(s) ignored: {', '.join(unknown_formats)}")
+        output_formats = [fmt for fmt in output_formats if fmt in TRANSCRIPT_WRITERS] or ["srt", "txt"]
+
+    global transcription_cache
+    if args.purge_cache:
+        TranscriptionCache(cache_dir, cache_max_size_mb).purge()
+        print(f"Transcription cache purged: {cache_dir}")
+        sys.exit(0)
+    if cache_enabled and not args.no_cache:
+        transcription_cache = TranscriptionCache(cache_dir, cache_max_size_mb)
+
+    # Durable job journal: file jobs are recorded so a restart or crash doesn't lose them
+    global job_journal
+    if journal_enabled:
+        job_journal = JobJournal(journal_path)
+        transcription_queue.journal = job_journal
+        if args.journal:
+            print_journal_summary()
+            sys.exit(0)
+        job_journal.prune(journal_keep_days)
+        if args.retry_failed:
+            print(f"[Journal] {job_journal.requeue_failed()} failed job(s) queued again.")
+    elif args.journal or args.retry_failed:
+        print("The job journal is disabled ([journal] enabled = false).")
+        sys.exit(0)
+
+    # Recording archive: also opened for --find-recording, which only reads its index
+    global recording_archive
+    if archive_enabled or args.archive or args.find_recording is not None:
+        if archive_format not in ARCHIVE_MUXERS:
+            print(f"Error: Unknown archive format '{archive_format}'. Use flac or opus.")
+            sys.exit(1)
+        recording_archive = RecordingArchive(
+            archive_dir, archive_index_path, archive_format, archive_opus_bitrate, archive_min_age_minutes,
+            archive_keep_days, archive_max_count, archive_max_total_mb,
+        )
+    if args.find_recording is not None:
+        print_recording_matches(args.find_recording)
+        sys.exit(0)
+
+    # Per-model thread counts measured by --autotune on this host
+    global thread_profiles
+    if args.autotune:
+        run_autotune(args.engine or engine_backend)
+        sys.exit(0)
+    thread_profiles = ThreadProfiles(thread_profiles_path)
+    if thread_profiles.profiles:
+        best = ", ".join(f"{model} {profile['best']}" for model, profile in sorted(thread_profiles.profiles.items()))
+        print(f"Thread profiles ({thread_profiles.host}): {best}")
+
+    # Per-job model routing learns from execution.tsv; also used after a live switch to auto
+    global model_router
+    model_router = ModelRouter(min_samples=routing_min_samples)
+    if model_selected == MODEL_AUTO:
+        fitted = ", ".join(sorted(model_router.fitted)) or "none yet"
+        print(f"Model routing: auto over {', '.join(routing_models)} (measured: {fitted})")
+
+    if not args.headless:
+        print("Available audio devices:")
+        print(sd.query_devices())
 
-    # Start the transcription thread
-    transcription_thread = threading.Thread(target=run_transcription, daemon=True)
-    transcription_thread.start()
+    # Create one transcription backend per pool worker and keep them healthy in the background
+    global worker_count, engines
+    if args.workers:
+        worker_count = args.workers
+    engines = [create_engine(args.engine or engine_backend) for _ in range(max(1, worker_count))]
+    engine = engines[0]
+    print(f"Transcription engine: {engine.name} ({len(engines)} worker(s), CPU budget {cpu_budget})")
+    if health_check_interval > 0:
+        health_thread = threading.Thread(target=run_engine_health_monitor, daemon=True)
+        health_thread.start()
+
+    if in_memory_handoff and not engine.supports_pcm:
+        print(f"Note: the {engine.name} engine only reads files; in-memory recordings use a temporary WAV.")
+
+    # Decode upcoming batch files while the current one is transcribed
+    global prefetcher
+    if prefetch_enabled:
+        prefetcher = Prefetcher(prefetch_memory_mb)
+        prefetch_thread = threading.Thread(target=prefetcher.run, daemon=True)
+        prefetch_thread.start()
+
+    # Watch folders: queue media files dropped into the configured directories
+    watch_roots = watch_directories if watch_enabled else []
+    watch_roots = watch_roots + (args.watch or [])
+    if watch_roots:
+        watcher = FolderWatcher(
+            watch_roots, WatchIndex(watch_index_path), watch_recursive, watch_settle_seconds, watch_ingest_existing
+        )
+        watch_thread = threading.Thread(target=watcher.run, args=(watch_poll_seconds,), daemon=True)
+        watch_thread.start()
+
+    # Recording archive: compress finished recordings at low priority and apply retention
+    if archive_enabled or args.archive:
+        archive_thread = threading.Thread(target=recording_archive.run, args=(archive_interval_minutes * 60,), daemon=True)
+        archive_thread.start()
+
+    # Local job API: other tools submit work to this process and its loaded models
+    if api_enabled or args.api:
+        start_api_server(api_port)
+
+    # Per-stage latency metrics: JSON lines and/or a local HTTP endpoint
+    if metrics_enabled:
+        if metrics_file:
+            print(f"Metrics file: {metrics_file}")
+            metrics_thread = threading.Thread(target=run_metrics_snapshots, daemon=True)
+            metrics_thread.start()
+        if metrics_http_port:
+            start_metrics_server(metrics_http_port)
+
+    # Persist WAV/SRT/TXT artifacts in the background
+    artifact_thread = threading.Thread(target=run_artifact_writer, daemon=True)
+    artifact_thread.start()
+
+    # Start the transcription worker pool
+    for index, worker_engine in enumerate(engines, start=1):
+        transcription_thread = threading.Thread(
+            target=run_transcription, args=(f"worker-{index}", worker_engine), daemon=True
+        )
+        transcription_thread.start()
+
+    # Batch runs exit once the queue is empty, unless the tray, watch folders or the API keep them running
+    serving = tray or watch_roots or api_enabled or args.api
+    batch_run = bool(args.files or args.manifest or args.headless) and not serving
+
+    # Unfinished jobs of the last run go first, in their original order. Only a long-running
+    # instance resumes them, and only the one holding the journal: a one-off batch run or a
+    # second instance would otherwise run (and exit over) jobs that belong to another one.
+    resumed_paths = set()
+    if job_journal is not None and not batch_run:
+        if job_journal.claim():
+            resumed_paths = resume_journal()
+        else:
+            print("[Journal] Another instance owns the journal; its unfinished jobs are not resumed here.")
 
     # If files were passed as arguments, queue them up
     if args.files:
@@ -670,15 +4784,38 @@ def main():
         skip_cb = len(args.files) > 1
         for f in args.files:
             path = Path(f)
-            if path.exists() and path.is_file():
-                transcription_queue.put((str(path), skip_cb, time.time()))
+            if str(path.resolve()) in resumed_paths:
+                print(f"Already resumed from the journal: {f}")
+            elif path.exists() and path.is_file():
+                queue_batch_file(path, skip_cb)
             else:
                 print(f"Warning: File not found or invalid: {f}")
 
-        # If not in tray mode, wait for queue to be empty and then exit
-        if not tray:
-            transcription_queue.join()
-            print("All files processed. Exiting.")
+    # Manifest entries: per-entry settings, finished entries are skipped, results go to a JSONL file
+    manifest_run = None
+    if args.manifest:
+        results_path = args.results or f"{os.path.splitext(args.manifest)[0]}.results.jsonl"
+        manifest_run = ManifestRun(args.manifest, results_path, ManifestIndex(manifest_index_path))
+        manifest_run.queue()
+
+    if batch_run:
+        transcription_queue.join()
+        artifact_queue.join()
+        if manifest_run is not None:
+            manifest_run.close()
+        if show_stats:
+            print_cache_stats()
+            print_metrics_summary()
+        print("All files processed. Exiting.")
+        sys.exit(0)
+
+    if args.headless:
+        # No hotkeys or tray: the watch folders and the API feed the queue until interrupted
+        print("\nHeadless: serving watch folders and API jobs. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
             sys.exit(0)
 
     # Start the icon update thread
@@ -710,6 +4847,11 @@ def main():
     hk_primary = create_vk_hotkey(hotkey, on_activate_primary)
     hk_fragment = create_vk_hotkey(hotkey_fragment, on_activate_fragment)
     hotkeys = [hk_primary, hk_fragment]
+    # Optional live switching hotkeys
+    if hotkey_cycle_language:
+        hotkeys.append(create_vk_hotkey(hotkey_cycle_language, cycle_language))
+    if hotkey_cycle_model:
+        hotkeys.append(create_vk_hotkey(hotkey_cycle_model, cycle_model))
 
     # variable to hold the listener instance so it can be used in callbacks
     listener = None